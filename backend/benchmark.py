@@ -0,0 +1,253 @@
+"""
+Benchmark harness for the OEE backend.
+
+Generates datasets at several scales, times each pipeline stage (Excel load,
+streaming ingestion, validation, cube build, query parsing, OEE calculation
+and the /api/query path through FastAPI's TestClient), measures peak memory
+(Python allocations with tracemalloc, and on Linux the peak resident set
+size, which also counts the numpy and Arrow buffers tracemalloc cannot see)
+and writes machine-readable JSON that can be compared between runs:
+
+    python benchmark.py --rows 1000,100000 --output bench.json
+    python benchmark.py --rows 1000,100000 --compare bench.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_processor import DataProcessor
+from data_validator import DataValidator
+from generate_sample_data import build_sample_frame
+from ingestion import ingest_file
+from query_processor import QueryProcessor
+
+EXCEL_ROW_LIMIT = 1048575
+
+
+def _rss_status(field: str) -> Optional[int]:
+    """A memory figure of this process from /proc (Linux only), in bytes"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_growth(fn: Callable) -> Optional[int]:
+    """
+    How far the resident set size peaked above its level before fn ran.
+    Resets the kernel's high-water mark first, so only fn's peak is seen;
+    None where that is not possible.
+    """
+    before = _rss_status("VmRSS")
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return None
+    fn()
+    peak = _rss_status("VmHWM")
+    return max(peak - before, 0) if peak is not None and before is not None else None
+
+
+def measure(fn: Callable, repeat: int = 1, track_memory: bool = True) -> Dict:
+    """
+    Time fn over `repeat` calls, then run it once for its peak RSS and once
+    more under tracemalloc, so neither memory measurement distorts the timing
+    and tracemalloc's own bookkeeping does not count towards the RSS.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    seconds = (time.perf_counter() - start) / repeat
+
+    peak = peak_rss = None
+    if track_memory:
+        peak_rss = peak_rss_growth(fn)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"seconds": seconds, "ops_per_sec": 1 / seconds if seconds > 0 else None,
+            "peak_bytes": peak, "peak_rss_bytes": peak_rss}
+
+
+def dimensions_for(rows: int, n_locations: int, n_months: int) -> Dict[str, int]:
+    """Pick a device count so devices * locations * months is close to rows"""
+    n_devices = max(1, math.ceil(rows / (n_locations * n_months)))
+    return {"n_devices": n_devices, "n_locations": n_locations, "n_months": n_months}
+
+
+def make_dataset(dims: Dict[str, int], seed: int) -> pd.DataFrame:
+    return build_sample_frame(seed=seed, **dims)
+
+
+def random_filters(filters: Dict[str, List], count: int, seed: int) -> List[Dict[str, Optional[str]]]:
+    rng = np.random.RandomState(seed)
+    choices = []
+    for _ in range(count):
+        choices.append({
+            "device_id": rng.choice(filters["device_ids"]) if rng.random() < 0.8 else None,
+            "location": rng.choice(filters["locations"]) if rng.random() < 0.5 else None,
+            "month": rng.choice(filters["months"]) if rng.random() < 0.5 else None
+        })
+    return choices
+
+
+def query_messages(filters: List[Dict[str, Optional[str]]]) -> List[str]:
+    messages = []
+    for f in filters:
+        parts = ["what is the oee"]
+        if f["device_id"]:
+            parts.append(f"for {f['device_id'].lower()}")
+        if f["location"]:
+            parts.append(f"at {f['location'].replace('_', ' ').lower()}")
+        if f["month"]:
+            parts.append(f"in {f['month']}")
+        messages.append(" ".join(parts))
+    return messages
+
+
+def bench_api(processor: DataProcessor, messages: List[str]) -> Dict[str, Dict]:
+    """Requests per second through the full /api/query path"""
+    from fastapi.testclient import TestClient
+    import main
+
+    async def publish():
+        async with main.datasets.write_lock:
+            await main.publish_dataset(processor)
+
+    results = {}
+    with TestClient(main.app) as client:
+        # The same path an upload takes: filters, facets, vocabulary and caches follow the dataset
+        client.portal.call(publish)
+        for label in ("api_query_cold", "api_query_cached"):
+            start = time.perf_counter()
+            for message in messages:
+                client.post("/api/query", json={"message": message})
+            seconds = time.perf_counter() - start
+            results[label] = {"seconds": seconds / len(messages),
+                              "ops_per_sec": len(messages) / seconds, "peak_bytes": None, "peak_rss_bytes": None}
+    return results
+
+
+def run_scale(rows: int, args, workdir: str) -> List[Dict]:
+    dims = dimensions_for(rows, args.locations, args.months)
+    df = make_dataset(dims, args.seed)
+    records = []
+
+    def record(stage: str, result: Dict):
+        records.append({"rows": len(df), **dims, "stage": stage, **result})
+        print(f"{len(df):>10} rows  {stage:<22} {result['seconds'] * 1000:>12.3f} ms"
+              + (f"  peak {result['peak_bytes'] / 2 ** 20:>9.1f} MiB" if result['peak_bytes'] else "")
+              + (f"  rss +{result['peak_rss_bytes'] / 2 ** 20:>9.1f} MiB" if result['peak_rss_bytes'] else ""))
+
+    csv_path = os.path.join(workdir, f"bench_{rows}.csv")
+    df.to_csv(csv_path, index=False)
+
+    if not args.skip_excel and len(df) <= EXCEL_ROW_LIMIT:
+        xlsx_path = os.path.join(workdir, f"bench_{rows}.xlsx")
+        df.to_excel(xlsx_path, index=False)
+        record("load_data_excel", measure(lambda: DataProcessor(xlsx_path), track_memory=args.memory))
+        record("ingest_excel", measure(lambda: ingest_file(xlsx_path), track_memory=args.memory))
+
+    record("ingest_csv", measure(lambda: ingest_file(csv_path), track_memory=args.memory))
+
+    typed = DataProcessor.prepare_frame(df.copy())
+    record("validate_data", measure(lambda: DataValidator.validate_data(typed), track_memory=args.memory))
+    record("build_cube", measure(lambda: DataProcessor.from_frame(typed), track_memory=args.memory))
+
+    processor = DataProcessor.from_frame(typed)
+    filters = processor.get_available_filters()
+    sample = random_filters(filters, args.queries, args.seed)
+    messages = query_messages(sample)
+
+    parser = QueryProcessor(filters)
+    record("build_vocabulary", measure(lambda: QueryProcessor(filters), track_memory=args.memory))
+    parse = measure(lambda: [parser.process_query(m) for m in messages], track_memory=args.memory)
+    record("process_query", {**parse, "seconds": parse["seconds"] / len(messages),
+                             "ops_per_sec": len(messages) / parse["seconds"]})
+    calc = measure(lambda: [processor.calculate_oee(**f) for f in sample], track_memory=args.memory)
+    record("calculate_oee", {**calc, "seconds": calc["seconds"] / len(sample),
+                             "ops_per_sec": len(sample) / calc["seconds"]})
+    record("calculate_oee_batch", measure(lambda: processor.calculate_oee_batch(sample),
+                                          track_memory=args.memory))
+    record("get_available_filters", measure(processor.get_available_filters, track_memory=args.memory))
+
+    if not args.skip_api:
+        for stage, result in bench_api(processor, messages).items():
+            record(stage, result)
+    return records
+
+
+def compare(current: List[Dict], baseline_path: str):
+    """Print the ratio of current to baseline timings for matching (rows, stage) pairs"""
+    with open(baseline_path) as f:
+        baseline = {(r["rows"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\n{'rows':>10}  {'stage':<22} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for r in current:
+        base = baseline.get((r["rows"], r["stage"]))
+        if base is None:
+            continue
+        ratio = r["seconds"] / base["seconds"] if base["seconds"] else float("nan")
+        print(f"{r['rows']:>10}  {r['stage']:<22} {base['seconds'] * 1000:>12.3f} "
+              f"{r['seconds'] * 1000:>12.3f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OEE backend at several dataset sizes")
+    parser.add_argument("--rows", default="1000,10000,100000",
+                        help="comma-separated target row counts (e.g. 1000,1e5,1e7)")
+    parser.add_argument("--locations", type=int, default=5, help="locations per dataset")
+    parser.add_argument("--months", type=int, default=24, help="months per dataset")
+    parser.add_argument("--queries", type=int, default=200, help="queries per query-path stage")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the memory runs")
+    parser.add_argument("--skip-excel", action="store_true", help="skip xlsx stages")
+    parser.add_argument("--skip-api", action="store_true", help="skip TestClient throughput stages")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in [int(float(r)) for r in args.rows.split(",") if r.strip()]:
+            results.extend(run_scale(rows, args, workdir))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
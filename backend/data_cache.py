@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+CACHE_SUFFIX = '.arrow'
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DataCache:
+    """
+    Columnar sidecar cache for parsed OEE workbooks.
+
+    Parsed frames are stored as uncompressed Arrow IPC files named after the
+    SHA-256 of the source workbook, so they can be memory-mapped on load and
+    shared by identical re-uploads. A small index maps (path, mtime, size) to
+    the digest so warm starts do not even need to re-hash the source file.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, INDEX_FILE)
+        if pa is None:
+            logger.warning("pyarrow is not installed; columnar data cache is disabled")
+
+    @property
+    def enabled(self) -> bool:
+        return pa is not None
+
+    def _cache_path(self, digest: str, compact: bool = False) -> str:
+        layout = ".compact" if compact else ""
+        return os.path.join(self.cache_dir, f"{digest}{layout}{CACHE_SUFFIX}")
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self._index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict]):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def digest_for(self, source_path: str) -> str:
+        """Get the content digest of a source file, reusing the index when mtime and size match"""
+        stat = os.stat(source_path)
+        entry = self._read_index().get(os.path.abspath(source_path))
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['digest']
+        return file_digest(source_path)
+
+    def _remember(self, source_path: str, digest: str):
+        stat = os.stat(source_path)
+        index = self._read_index()
+        index[os.path.abspath(source_path)] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'digest': digest
+        }
+        self._write_index(index)
+
+    def load(self, source_path: str, digest: Optional[str] = None,
+             compact: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Return the cached frame for a source file, or None on a miss.
+        Compact frames are converted block by block so numeric columns can
+        stay backed by the memory-mapped file, whose pages the OS shares
+        between every worker process reading the same cache entry.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            digest = digest or self.digest_for(source_path)
+            cache_path = self._cache_path(digest, compact)
+            if not os.path.exists(cache_path):
+                return None
+            table = feather.read_table(cache_path, memory_map=True)
+            self._remember(source_path, digest)
+            logger.debug("Loaded %s from columnar cache %s", source_path, cache_path)
+            if compact:
+                return table.to_pandas(split_blocks=True)
+            return table.to_pandas()
+        except Exception as e:
+            logger.warning("Ignoring unreadable data cache for %s: %s", source_path, e)
+            return None
+
+    def store(self, source_path: str, df: pd.DataFrame, digest: Optional[str] = None,
+              compact: bool = False):
+        """Write a parsed frame to the cache under the source file's digest"""
+        if not self.enabled:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            digest = digest or self.digest_for(source_path)
+            cache_path = self._cache_path(digest, compact)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            feather.write_feather(df, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, cache_path)
+            self._remember(source_path, digest)
+            logger.debug("Stored columnar cache for %s at %s", source_path, cache_path)
+        except Exception as e:
+            logger.warning("Could not write data cache for %s: %s", source_path, e)
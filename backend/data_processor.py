@@ -1,119 +1,608 @@
+import copy
+import itertools
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterator, List
 import os
 from datetime import datetime
 import logging
+from oee_cube import GROUP_BATCH_ROWS, MEASURES, OEECube, compute_components, compute_losses
+from data_cache import DataCache
+from data_validator import DataValidator
+from metrics import span, timed
+from filter_index import FacetIndex, FilterIndex
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+KEY_COLUMNS = ['device_id', 'location', 'month']
+COMPONENTS = ['oee', 'availability', 'performance', 'quality']
+LOSS_CATEGORIES = ['availability_loss', 'performance_loss', 'quality_loss']
+OUTLIER_METHODS = {'zscore': 2.0, 'iqr': 1.5}  # method -> default threshold
+MIN_OUTLIER_MONTHS = 4
+
+# Dataset versions are unique across processor instances so caches keyed on
+# them can never confuse an old dataset with a newly uploaded one
+_dataset_versions = itertools.count(1)
+
 class DataProcessor:
-    def __init__(self, data_path: str = None):
+    def __init__(self, data_path: str = None, cache: Optional[DataCache] = None, compact: bool = False):
         self.data_path = data_path
+        self.cache = cache
+        self.compact = compact
         self.df = None
+        self.cube = None
+        # Set when the dataset lives in a storage backend (PartitionedStore or
+        # SQLiteStore) instead of memory; the store then also serves as the cube
+        self.store = None
+        self.version = 0
+        # Dataset size, measured whenever the data changes rather than on every health check
+        self._memory = {"rows": 0, "frame_bytes": 0, "cube_bytes": 0}
+        # (version, FilterIndex) and (version, FacetIndex), built once per dataset version
+        self._filter_index = None
+        self._facet_index = None
         if data_path:
             self.load_data()
 
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, data_path: Optional[str] = None,
+                   cache: Optional[DataCache] = None, compact: bool = False) -> 'DataProcessor':
+        """Build a processor over an already parsed and typed frame"""
+        processor = cls(cache=cache, compact=compact)
+        processor.data_path = data_path
+        processor.set_data(df)
+        return processor
+
+    @classmethod
+    def from_store(cls, store, data_path: Optional[str] = None) -> 'DataProcessor':
+        """Build a processor that aggregates from an on-disk storage backend"""
+        processor = cls()
+        processor.data_path = data_path
+        processor.store = processor.cube = store
+        processor.version = next(_dataset_versions)
+        processor._measure_memory()
+        return processor
+
+    @timed("load")
     def load_data(self):
-        """Load and preprocess the Excel data"""
+        """
+        Load and preprocess the Excel data, using the columnar cache when available.
+        The frame is validated before the cube is built or the frame is cached,
+        so an invalid workbook never reaches either.
+        """
         try:
-            logger.debug(f"Loading data from: {self.data_path}")
-            self.df = pd.read_excel(self.data_path)
-            logger.debug(f"Data loaded successfully. Shape: {self.df.shape}")
-            # Convert date columns to datetime if they exist
-            date_columns = [col for col in self.df.columns if 'date' in col.lower()]
-            for col in date_columns:
-                self.df[col] = pd.to_datetime(self.df[col])
+            cached = self.cache.load(self.data_path, compact=self.compact) if self.cache else None
+            if cached is not None:
+                df = cached
+                logger.debug("Data loaded from cache. Shape: %s", df.shape)
+            else:
+                logger.debug("Loading data from: %s", self.data_path)
+                df = pd.read_excel(self.data_path)
+                logger.debug("Data loaded successfully. Shape: %s", df.shape)
+
+            is_valid, validation_results = DataValidator.validate_data(df)
+            if not is_valid:
+                raise ValueError(DataValidator.get_validation_message(validation_results))
+
+            if cached is None:
+                df = self.prepare_frame(df, compact=self.compact)
+                if self.cache:
+                    self.cache.store(self.data_path, df, compact=self.compact)
+            self.set_data(df)
         except Exception as e:
-            logger.error(f"Error loading data: {str(e)}")
+            logger.error("Error loading data: %s", e)
             raise Exception(f"Error loading data: {str(e)}")
 
+    def set_data(self, df: pd.DataFrame):
+        """Replace the dataset and rebuild the OEE cube"""
+        self.df = df
+        with span("build_cube"):
+            self.cube = OEECube(self.df)
+        self.version = next(_dataset_versions)
+        self._measure_memory()
+        logger.debug("OEE cube built for dataset version %s", self.version)
+
+    def copy(self) -> 'DataProcessor':
+        """
+        Copy that can be appended to without affecting this processor,
+        so a published dataset stays immutable while its successor is built
+        """
+        clone = copy.copy(self)
+        clone.cube = self.cube.copy() if self.cube is not None else None
+        if self.store is not None:
+            clone.store = clone.cube
+        return clone
+
+    def release(self):
+        """Free what reading this dataset holds (a store's read snapshot) once it has been retired"""
+        if self.store is not None:
+            self.store.release()
+
+    def append_data(self, new_df: pd.DataFrame, replace_existing: bool = False) -> Dict[str, int]:
+        """
+        Merge new rows into the dataset, deduplicated on (device_id, location, month).
+        Rows whose key already exists are skipped, or replace the stored rows when
+        replace_existing is set. The OEE cube is updated incrementally.
+        """
+        if self.store is not None:
+            summary = self.store.append(self.prepare_frame(new_df.copy(), compact=self.compact),
+                                        replace_existing=replace_existing)
+            self.version = next(_dataset_versions)
+            self._measure_memory()
+            return {**summary, "total_rows": self._memory["rows"]}
+
+        if self.df is None:
+            self.set_data(self.prepare_frame(new_df.drop_duplicates(KEY_COLUMNS, keep='last'), compact=self.compact))
+            return {"rows_received": len(new_df), "rows_added": len(self.df),
+                    "rows_replaced": 0, "rows_skipped": len(new_df) - len(self.df),
+                    "total_rows": len(self.df)}
+
+        delta = new_df.drop_duplicates(KEY_COLUMNS, keep='last')
+        delta_keys = pd.MultiIndex.from_frame(delta[KEY_COLUMNS].astype(object))
+        existing = delta_keys.isin(self.cube.cells.index[self.cube.cells['row_count'] > 0])
+
+        df = self.df
+        rows_replaced = 0
+        if replace_existing and existing.any():
+            stored_keys = pd.MultiIndex.from_frame(df[KEY_COLUMNS].astype(object))
+            stale = stored_keys.isin(delta_keys[existing])
+            self.cube.merge(df[stale], sign=-1)
+            df = df[~stale]
+            rows_replaced = int(existing.sum())
+        else:
+            delta = delta[~existing]
+
+        self.cube.merge(delta)
+        self.df = self.concat_frames(df, self.prepare_frame(delta.copy(), compact=self.compact))
+        self.version = next(_dataset_versions)
+        self._measure_memory()
+        logger.debug("Appended %d rows. Shape: %s", len(delta), self.df.shape)
+
+        return {
+            "rows_received": len(new_df),
+            "rows_added": len(delta) - rows_replaced,
+            "rows_replaced": rows_replaced,
+            "rows_skipped": len(new_df) - len(delta),
+            "total_rows": len(self.df)
+        }
+
+    @staticmethod
+    def concat_frames(*frames: pd.DataFrame) -> pd.DataFrame:
+        """Concatenate prepared frames, keeping the key columns categorical"""
+        frames = [frame.copy() for frame in frames]
+        for col in KEY_COLUMNS:
+            categories = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[col].cat.categories)
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def prepare_frame(df: pd.DataFrame, compact: bool = False) -> pd.DataFrame:
+        """
+        Convert key columns to categoricals and date columns to datetimes.
+        Categoricals store each key as a small integer code into a sorted
+        dictionary, so months are held as integer period codes. In compact
+        mode integer columns are downcast losslessly and float columns are
+        stored as float32, which is lossy: values keep only about seven
+        significant digits (e.g. 123456.78 is stored as 123456.78125).
+        Aggregation still accumulates in float64, but from the rounded values.
+        """
+        for col in KEY_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        # Convert date columns to datetime if they exist
+        date_columns = [col for col in df.columns if 'date' in col.lower()]
+        for col in date_columns:
+            df[col] = pd.to_datetime(df[col])
+
+        if compact:
+            for col in df.select_dtypes(include='integer').columns:
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+            for col in df.select_dtypes(include='floating').columns:
+                df[col] = df[col].astype('float32')
+        return df
+
+    def _measure_memory(self):
+        """Record the dataset's size after it changes, so reading it later costs nothing"""
+        if self.store is not None:
+            self._memory = {"rows": self.store.row_count, "frame_bytes": 0, "cube_bytes": 0}
+        elif self.df is None:
+            self._memory = {"rows": 0, "frame_bytes": 0, "cube_bytes": 0}
+        else:
+            self._memory = {
+                "rows": len(self.df),
+                "frame_bytes": int(self.df.memory_usage(deep=True).sum()),
+                "cube_bytes": self.cube.nbytes()
+            }
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate memory held by the dataset and its OEE cube, in bytes, as of its last change"""
+        if self.store is not None:
+            # Cached partition totals come and go with queries; the store keeps a running size
+            return {**self._memory, "cube_bytes": self.store.nbytes()}
+        return dict(self._memory)
+
     def calculate_oee(self, device_id: Optional[str] = None, 
                      location: Optional[str] = None, 
-                     month: Optional[str] = None) -> Dict:
+                     month: Optional[str] = None,
+                     include_message: bool = True) -> Dict:
         """
         Calculate OEE based on the formula: OEE = Availability × Performance × Quality
         
         Availability = Operating Time / Planned Production Time
         Performance = (Total Count × Ideal Cycle Time) / Operating Time
         Quality = Good Count / Total Count
+
+        Without include_message the result has the numbers only, and no message is formatted.
         """
-        if self.df is None:
+        if self.cube is None:
             logger.error("No data loaded")
             return {"error": "No data loaded. Please upload data first."}
 
         try:
-            # Filter data based on parameters
-            filtered_df = self.df.copy()
-            logger.debug(f"Initial data shape: {filtered_df.shape}")
-            
-            if device_id:
-                filtered_df = filtered_df[filtered_df['device_id'] == device_id]
-                logger.debug(f"After device_id filter: {filtered_df.shape}")
-            if location:
-                filtered_df = filtered_df[filtered_df['location'] == location]
-                logger.debug(f"After location filter: {filtered_df.shape}")
-            if month:
-                filtered_df = filtered_df[filtered_df['month'] == month]
-                logger.debug(f"After month filter: {filtered_df.shape}")
-
-            if filtered_df.empty:
-                logger.warning(f"No data found for: device_id={device_id}, location={location}, month={month}")
-                return {
-                    "oee": 0,
-                    "availability": 0,
-                    "performance": 0,
-                    "quality": 0,
-                    "message": "No data found for the specified parameters"
-                }
+            # Look up pre-aggregated totals, skipping combinations the facet index knows are empty
+            with span("filter"):
+                totals = (self.cube.totals(device_id=device_id, location=location, month=month)
+                          if self.facet_index().exists(device_id, location, month) else None)
 
-            # Calculate OEE components
-            planned_production_time = filtered_df['planned_production_time'].sum()
-            operating_time = filtered_df['operating_time'].sum()
-            total_count = filtered_df['total_count'].sum()
-            good_count = filtered_df['good_count'].sum()
-            ideal_cycle_time = filtered_df['ideal_cycle_time'].mean()
+            if totals is None:
+                logger.warning("No data found for: device_id=%s, location=%s, month=%s", device_id, location, month)
+                result = {"oee": 0, "availability": 0, "performance": 0, "quality": 0}
+                if include_message:
+                    result["message"] = "No data found for the specified parameters"
+                return result
 
-            logger.debug(f"Raw values: ppt={planned_production_time}, ot={operating_time}, tc={total_count}, gc={good_count}, ict={ideal_cycle_time}")
+            with span("aggregate"):
+                # Calculate OEE components
+                planned_production_time = totals['planned_production_time']
+                operating_time = totals['operating_time']
+                total_count = totals['total_count']
+                good_count = totals['good_count']
+                ideal_cycle_time = (totals['ideal_cycle_time_sum'] / totals['ideal_cycle_time_count']
+                                    if totals['ideal_cycle_time_count'] > 0 else float('nan'))
 
-            # Calculate components (all values between 0 and 1)
-            availability = (operating_time / planned_production_time) if planned_production_time > 0 else 0
+                logger.debug("Raw values: ppt=%s, ot=%s, tc=%s, gc=%s, ict=%s",
+                             planned_production_time, operating_time, total_count, good_count, ideal_cycle_time)
+
+                # Calculate components (all values between 0 and 1)
+                availability = (operating_time / planned_production_time) if planned_production_time > 0 else 0
             
-            # Calculate theoretical production time based on ideal cycle time
-            theoretical_production_time = total_count * ideal_cycle_time / 60  # Convert to hours
-            performance = (theoretical_production_time / operating_time) if operating_time > 0 else 0
+                # Calculate theoretical production time based on ideal cycle time
+                theoretical_production_time = total_count * ideal_cycle_time / 60  # Convert to hours
+                performance = (theoretical_production_time / operating_time) if operating_time > 0 else 0
             
-            quality = (good_count / total_count) if total_count > 0 else 0
+                quality = (good_count / total_count) if total_count > 0 else 0
 
-            logger.debug(f"Component values: a={availability}, p={performance}, q={quality}")
+                logger.debug("Component values: a=%s, p=%s, q=%s", availability, performance, quality)
 
-            # Ensure all components are between 0 and 1
-            availability = min(max(availability, 0), 1)
-            performance = min(max(performance, 0), 1)
-            quality = min(max(quality, 0), 1)
+                # Ensure all components are between 0 and 1
+                availability = min(max(availability, 0), 1)
+                performance = min(max(performance, 0), 1)
+                quality = min(max(quality, 0), 1)
 
-            # Calculate OEE
-            oee = availability * performance * quality
+                # Calculate OEE
+                oee = availability * performance * quality
 
             # Convert to percentages for display
-            return {
+            result = {
                 "oee": round(oee * 100, 2),
                 "availability": round(availability * 100, 2),
                 "performance": round(performance * 100, 2),
-                "quality": round(quality * 100, 2),
-                "message": f"OEE Calculation Results:\n"
-                         f"Availability: {round(availability * 100, 2)}%\n"
-                         f"Performance: {round(performance * 100, 2)}%\n"
-                         f"Quality: {round(quality * 100, 2)}%\n"
-                         f"Overall OEE: {round(oee * 100, 2)}%"
+                "quality": round(quality * 100, 2)
             }
+            if include_message:
+                result["message"] = (f"OEE Calculation Results:\n"
+                                     f"Availability: {result['availability']}%\n"
+                                     f"Performance: {result['performance']}%\n"
+                                     f"Quality: {result['quality']}%\n"
+                                     f"Overall OEE: {result['oee']}%")
+            return result
 
         except Exception as e:
-            logger.error(f"Error calculating OEE: {str(e)}")
+            logger.error("Error calculating OEE: %s", e)
             return {"error": f"Error calculating OEE: {str(e)}"}
 
+    @timed("aggregate_batch")
+    def calculate_oee_batch(self, filters: List[Dict[str, Optional[str]]]) -> List[Dict]:
+        """
+        Calculate OEE for many (device_id, location, month) filter combinations
+        with one vectorized lookup per rollup level
+        """
+        if self.cube is None:
+            raise ValueError("No data loaded. Please upload data first.")
+
+        totals = self.cube.totals_many(filters)
+        return self._component_records(
+            totals, [{col: f.get(col) or None for col in KEY_COLUMNS} for f in filters])
+
+    @timed("aggregate_grouped")
+    def calculate_oee_grouped(self, group_by: List[str], device_id: Optional[str] = None,
+                              location: Optional[str] = None,
+                              month: Optional[str] = None) -> List[Dict]:
+        """Calculate OEE for every group_by combination in a single groupby pass"""
+        if self.cube is None:
+            raise ValueError("No data loaded. Please upload data first.")
+        unknown = [col for col in group_by if col not in KEY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group by: {', '.join(unknown)}")
+
+        grouped = self.cube.grouped(group_by, {'device_id': device_id, 'location': location, 'month': month})
+        keys = grouped.index.to_frame(index=False).to_dict('records') if group_by else [{}]
+        return self._component_records(grouped.to_numpy(), keys)
+
+    @timed("aggregate_frame")
+    def oee_frames(self, group_by: List[str], device_id: Optional[str] = None,
+                   location: Optional[str] = None, month: Optional[str] = None,
+                   batch_rows: int = GROUP_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        OEE components for every group_by combination as frames of numbers
+        (key columns, components and row_count) of at most batch_rows groups,
+        without building per-row records or messages; used for bulk export.
+        Arguments are checked immediately; groups are read as frames are consumed.
+        """
+        if self.cube is None:
+            raise ValueError("No data loaded. Please upload data first.")
+        unknown = [col for col in group_by if col not in KEY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group by: {', '.join(unknown)}")
+        filters = {'device_id': device_id, 'location': location, 'month': month}
+        return (self._oee_frame(grouped, group_by)
+                for grouped in self.cube.iter_grouped(group_by, filters, batch_rows=batch_rows))
+
+    @staticmethod
+    def _oee_frame(grouped: pd.DataFrame, group_by: List[str]) -> pd.DataFrame:
+        totals = grouped.to_numpy()
+        frame = (grouped.index.to_frame(index=False).astype(str) if group_by
+                 else pd.DataFrame(index=range(len(grouped))))
+        for component, values in compute_components(totals).items():
+            frame[component] = values
+        frame['row_count'] = totals[:, MEASURES.index('row_count')].astype(np.int64)
+        return frame
+
+    @timed("trend")
+    def calculate_trend(self, device_id: Optional[str] = None, location: Optional[str] = None,
+                        windows: Optional[List[int]] = None,
+                        year_over_year: bool = False) -> List[Dict]:
+        """
+        Monthly OEE for a device and/or location from one pass over the month rollup.
+        Rolling windows (in calendar months) re-derive OEE from summed totals, and
+        year-over-year deltas are percentage-point changes from the same month a year earlier.
+        """
+        if self.cube is None:
+            raise ValueError("No data loaded. Please upload data first.")
+        if any(window < 1 for window in windows or []):
+            raise ValueError("Rolling windows must be at least one month")
+
+        grouped = self.cube.grouped(['month'], {'device_id': device_id, 'location': location})
+        if grouped.empty:
+            return []
+        try:
+            periods = pd.PeriodIndex(grouped.index.astype(str), freq='M')
+        except (ValueError, TypeError):
+            raise ValueError("Trends require months in YYYY-MM format")
+
+        # Reindex onto a gap-free calendar so rolling windows and shifts count real months
+        monthly = pd.DataFrame(grouped.to_numpy(), index=periods, columns=list(MEASURES)).sort_index()
+        calendar = monthly.reindex(pd.period_range(monthly.index.min(), monthly.index.max(), freq='M'),
+                                   fill_value=0.0)
+        present = calendar['row_count'].to_numpy() > 0
+        months = [{'month': str(period)} for period in calendar.index[present]]
+        records = self._component_records(calendar.to_numpy()[present], months)
+
+        for window in windows or []:
+            rolled = calendar.rolling(window, min_periods=1).sum().to_numpy()[present]
+            for record, rolling in zip(records, self._component_records(rolled, [{}] * len(records))):
+                record.setdefault('rolling', {})[str(window)] = rolling
+
+        if year_over_year:
+            prior = calendar.shift(12, fill_value=0.0).to_numpy()[present]
+            for record, previous in zip(records, self._component_records(prior, [{}] * len(records))):
+                record['yoy'] = {
+                    component: round(record[component] - previous[component], 2) if previous['row_count'] else None
+                    for component in COMPONENTS
+                }
+        return records
+
+    def rank_devices(self, location: Optional[str] = None, month: Optional[str] = None,
+                     top_n: int = 5, metric: str = 'oee') -> Dict[str, List[Dict]]:
+        """Top-N and bottom-N devices by an OEE component"""
+        if metric not in COMPONENTS:
+            raise ValueError(f"Cannot rank by: {metric}")
+        if top_n < 1:
+            raise ValueError("top_n must be at least 1")
+
+        records = self.calculate_oee_grouped(['device_id'], location=location, month=month)
+        values = np.array([record[metric] for record in records])
+        return {
+            "metric": metric,
+            "top": [records[i] for i in np.argsort(-values, kind='stable')[:top_n]],
+            "bottom": [records[i] for i in np.argsort(values, kind='stable')[:top_n]]
+        }
+
+    @timed("losses")
+    def analyze_losses(self, device_id: Optional[str] = None, location: Optional[str] = None,
+                       month: Optional[str] = None, top_n: int = 10, method: str = 'zscore',
+                       threshold: Optional[float] = None, include_cells: bool = True) -> Dict:
+        """
+        Split planned production time into availability, performance and
+        quality losses (in hours) for every (device_id, location, month) cell
+        in one vectorized pass, then rank devices and locations by lost time
+        (Pareto) and flag months whose loss is unusually high for that
+        device and location, by z-score or by Tukey's IQR fences.
+        With include_cells the per-cell losses are returned as well.
+        """
+        if self.cube is None:
+            raise ValueError("No data loaded. Please upload data first.")
+        if method not in OUTLIER_METHODS:
+            raise ValueError(f"Unknown outlier method: {method} (use one of {', '.join(OUTLIER_METHODS)})")
+        if top_n < 1:
+            raise ValueError("top_n must be at least 1")
+        threshold = OUTLIER_METHODS[method] if threshold is None else threshold
+
+        cells = self.cube.grouped(KEY_COLUMNS, {'device_id': device_id, 'location': location, 'month': month})
+        losses = pd.DataFrame(compute_losses(cells.to_numpy()), index=cells.index)
+        planned = cells['planned_production_time']
+
+        total_loss = losses.to_numpy().sum(axis=0)
+        order = np.argsort(-total_loss, kind='stable')
+        shares = self._shares(total_loss[order])
+        result = {
+            "planned_hours": round(float(planned.sum()), 2),
+            "productive_hours": round(float(planned.sum() - total_loss.sum()), 2),
+            "categories": [
+                {"category": LOSS_CATEGORIES[i], "hours": round(float(total_loss[i]), 2), **share}
+                for i, share in zip(order, shares)
+            ],
+            "pareto": {dim: self._loss_pareto(losses, dim, top_n) for dim in ('device_id', 'location')},
+            "outliers": self._loss_outliers(losses, method, threshold)
+        }
+        if include_cells:
+            result["cells"] = self._loss_cells(losses, planned)
+        return result
+
+    @staticmethod
+    def _loss_cells(losses: pd.DataFrame, planned: pd.Series) -> List[Dict]:
+        """Planned hours and lost hours per category for every (device_id, location, month) cell"""
+        frame = losses.index.to_frame(index=False).astype(str)
+        frame['planned_hours'] = planned.to_numpy().round(2)
+        for category in LOSS_CATEGORIES:
+            frame[category] = losses[category].to_numpy().round(2)
+        frame['total_loss'] = losses.to_numpy().sum(axis=1).round(2)
+        return frame.to_dict('records')
+
+    @staticmethod
+    def _shares(hours: np.ndarray) -> List[Dict]:
+        """Share and cumulative share of the total for hours sorted in descending order"""
+        total = hours.sum()
+        share = hours / total if total > 0 else np.zeros_like(hours)
+        return [{"share": round(float(s) * 100, 2), "cumulative_share": round(float(c) * 100, 2)}
+                for s, c in zip(share, np.cumsum(share))]
+
+    def _loss_pareto(self, losses: pd.DataFrame, dim: str, top_n: int) -> List[Dict]:
+        """Top-N values of a dimension by total lost hours, with their share of all losses"""
+        by_dim = losses.groupby(level=dim, observed=True).sum()
+        total = by_dim.to_numpy().sum(axis=1)
+        order = np.argsort(-total, kind='stable')
+        records = []
+        for i, share in zip(order[:top_n], self._shares(total[order])):
+            row = by_dim.iloc[i]
+            records.append({
+                dim: str(by_dim.index[i]),
+                **{category: round(float(row[category]), 2) for category in LOSS_CATEGORIES},
+                "total_loss": round(float(total[i]), 2),
+                **share
+            })
+        return records
+
+    @staticmethod
+    def _loss_outliers(losses: pd.DataFrame, method: str, threshold: float) -> List[Dict]:
+        """
+        Months whose lost hours in a category lie above the normal range for
+        their (device_id, location) series. Statistics are computed for every
+        series at once from group codes; series shorter than
+        MIN_OUTLIER_MONTHS are not scored.
+        """
+        if losses.empty:
+            return []
+        series = losses.index.droplevel('month')
+        codes, _ = pd.factorize(series)
+        counts = np.bincount(codes)
+        scored = counts[codes] >= MIN_OUTLIER_MONTHS
+        values = losses.to_numpy()
+
+        if method == 'zscore':
+            mean = np.stack([np.bincount(codes, weights=col) for col in values.T], axis=1) / counts[:, None]
+            deviation = values - mean[codes]
+            var = np.stack([np.bincount(codes, weights=col) for col in (deviation ** 2).T], axis=1) / counts[:, None]
+            spread = np.sqrt(var)[codes]
+            limit = mean[codes] + threshold * spread
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = np.where(spread > 0, deviation / spread, 0.0)
+        else:
+            # Per-series quartiles: sort by (series, value) and interpolate within each series' slice
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            q1 = np.empty((len(counts), values.shape[1]))
+            q3 = np.empty_like(q1)
+            for i, col in enumerate(values.T):
+                ordered = col[np.lexsort((col, codes))]
+                q1[:, i] = DataProcessor._group_quantile(ordered, starts, counts, 0.25)
+                q3[:, i] = DataProcessor._group_quantile(ordered, starts, counts, 0.75)
+            q1, q3 = q1[codes], q3[codes]
+            iqr = q3 - q1
+            limit = q3 + threshold * iqr
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = np.where(iqr > 0, (values - q3) / iqr, 0.0)
+
+        flagged = (values > limit) & (score > 0) & scored[:, None]
+        rows, cols = np.nonzero(flagged)
+        order = np.argsort(-score[rows, cols], kind='stable')
+        keys = losses.index[rows[order]]
+        return [
+            {
+                "device_id": str(key[0]),
+                "location": str(key[1]),
+                "month": str(key[2]),
+                "category": LOSS_CATEGORIES[c],
+                "hours": round(float(values[r, c]), 2),
+                "expected_max": round(float(limit[r, c]), 2),
+                "score": round(float(score[r, c]), 2)
+            }
+            for key, r, c in zip(keys, rows[order], cols[order])
+        ]
+
+    @staticmethod
+    def _group_quantile(ordered: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+        """Linear-interpolated quantile of each group's slice of a group-sorted array"""
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.ceil(position).astype(int)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    @staticmethod
+    def _component_records(totals, keys: List[Dict]) -> List[Dict]:
+        components = compute_components(totals)
+        row_counts = totals[:, MEASURES.index('row_count')].astype(int)
+        records = []
+        for i, key in enumerate(keys):
+            found = row_counts[i] > 0
+            records.append({
+                **key,
+                "oee": float(components["oee"][i]) if found else 0,
+                "availability": float(components["availability"][i]) if found else 0,
+                "performance": float(components["performance"][i]) if found else 0,
+                "quality": float(components["quality"][i]) if found else 0,
+                "row_count": int(row_counts[i])
+            })
+        return records
+
     def get_available_filters(self) -> Dict[str, List]:
-        """Get available filter options"""
+        """Get available filter options, sorted"""
+        return self.filter_index().as_dict()
+
+    def filter_index(self) -> FilterIndex:
+        """Searchable filter options for the current dataset version, built on first use"""
+        cached = self._filter_index
+        if cached is None or cached[0] != self.version:
+            cached = self._filter_index = (self.version, FilterIndex(self._scan_filters()))
+        return cached[1]
+
+    def cached_filter_index(self) -> Optional[FilterIndex]:
+        """The filter index if it was already built for this version, without building it"""
+        cached = self._filter_index
+        return cached[1] if cached is not None and cached[0] == self.version else None
+
+    def facet_index(self) -> FacetIndex:
+        """Index of the (device_id, location, month) combinations holding data, built on first use"""
+        cached = self._facet_index
+        if cached is None or cached[0] != self.version:
+            keys = self.cube.keys() if self.cube is not None else pd.DataFrame(columns=KEY_COLUMNS)
+            cached = self._facet_index = (self.version, FacetIndex(keys))
+        return cached[1]
+
+    def _scan_filters(self) -> Dict[str, List]:
+        if self.store is not None:
+            return self.store.available_filters()
         if self.df is None:
             return {
                 "device_ids": [],
@@ -2,6 +2,95 @@ import pandas as pd
 from typing import Dict, List, Tuple
 import numpy as np
 
+NUMERIC_COLUMNS = ['planned_production_time', 'operating_time', 'total_count', 'good_count', 'ideal_cycle_time']
+CRITICAL_COLUMNS = ['planned_production_time', 'operating_time', 'total_count']
+
+# (left, right, message) pairs where left must not exceed right
+CONSISTENCY_RULES = [
+    ('operating_time', 'planned_production_time', 'Operating time exceeds planned production time'),
+    ('good_count', 'total_count', 'Good count exceeds total count')
+]
+
+MAX_OFFENDING_ROWS = 20
+# Offending rows are kept as 0-based positions and reported as spreadsheet row numbers:
+# the header is row 1, so the first data row is row 2 (rows skipped on read as blank are not counted)
+FIRST_DATA_ROW = 2
+
+
+class ValidationReport:
+    """
+    Accumulates validation results over one or more chunks of a dataset.
+
+    All value rules of a chunk are evaluated together on a single float
+    matrix of the numeric columns, and up to max_offending_rows row
+    positions are kept per rule. With fail_fast, update() reports that
+    ingestion should stop as soon as any error has been recorded.
+    """
+
+    def __init__(self, fail_fast: bool = False, max_offending_rows: int = MAX_OFFENDING_ROWS):
+        self.fail_fast = fail_fast
+        self.max_offending_rows = max_offending_rows
+        self.results = DataValidator.empty_results()
+        self.rows_seen = 0
+
+    @property
+    def is_valid(self) -> bool:
+        return not any(len(value) > 0 for value in self.results.values())
+
+    def _record(self, category: str, name: str, rule: str, rows: np.ndarray):
+        if name not in self.results[category]:
+            self.results[category].append(name)
+        offending = self.results['offending_rows'].setdefault(rule, [])
+        room = self.max_offending_rows - len(offending)
+        if room > 0:
+            offending.extend(int(row) + self.rows_seen for row in rows[:room])
+
+    def update(self, df: pd.DataFrame) -> bool:
+        """
+        Validate the next chunk of rows.
+        Returns: False when validation should stop early
+        """
+        # Check required columns
+        missing_columns = [col for col in DataValidator.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            self.results['missing_columns'] = missing_columns
+            return False
+
+        # Validate data types; rules are only evaluated on numeric columns
+        for col in NUMERIC_COLUMNS:
+            if not pd.api.types.is_numeric_dtype(df[col]) and col not in self.results['invalid_data_types']:
+                self.results['invalid_data_types'].append(col)
+        if self.fail_fast and self.results['invalid_data_types']:
+            return False
+        numeric = [col for col in NUMERIC_COLUMNS if col not in self.results['invalid_data_types']]
+        position = {col: i for i, col in enumerate(numeric)}
+
+        # Evaluate every rule in one pass over the numeric matrix
+        values = df[numeric].to_numpy(dtype='float64', na_value=np.nan)
+        rules: List[Tuple[str, str, str]] = []
+        masks = []
+
+        rules.extend(('negative_values', col, f'negative:{col}') for col in numeric)
+        masks.append(values < 0)
+
+        critical = [col for col in CRITICAL_COLUMNS if col in position]
+        rules.extend(('zero_values', col, f'zero:{col}') for col in critical)
+        masks.append(values[:, [position[col] for col in critical]] == 0)
+
+        for left, right, message in CONSISTENCY_RULES:
+            if left in position and right in position:
+                rules.append(('data_consistency', message, f'{left}>{right}'))
+                masks.append((values[:, position[left]] > values[:, position[right]])[:, np.newaxis])
+
+        violations = np.concatenate(masks, axis=1)
+        for j in np.flatnonzero(violations.any(axis=0)):
+            category, name, rule = rules[j]
+            self._record(category, name, rule, np.flatnonzero(violations[:, j]))
+
+        self.rows_seen += len(df)
+        return not (self.fail_fast and not self.is_valid)
+
+
 class DataValidator:
     REQUIRED_COLUMNS = [
         'device_id',
@@ -15,55 +104,32 @@ class DataValidator:
     ]
 
     @staticmethod
-    def validate_data(df: pd.DataFrame) -> Tuple[bool, Dict]:
-        """
-        Validate the Excel data structure and content
-        Returns: (is_valid, validation_results)
-        """
-        validation_results = {
+    def empty_results() -> Dict[str, List]:
+        """Validation results with no errors recorded"""
+        return {
             'missing_columns': [],
             'invalid_data_types': [],
             'negative_values': [],
             'zero_values': [],
-            'data_consistency': []
+            'data_consistency': [],
+            'offending_rows': {}
         }
 
-        # Check required columns
-        missing_columns = [col for col in DataValidator.REQUIRED_COLUMNS if col not in df.columns]
-        if missing_columns:
-            validation_results['missing_columns'] = missing_columns
-            return False, validation_results
-
-        # Validate data types
-        numeric_columns = ['planned_production_time', 'operating_time', 'total_count', 'good_count', 'ideal_cycle_time']
-        for col in numeric_columns:
-            if not pd.api.types.is_numeric_dtype(df[col]):
-                validation_results['invalid_data_types'].append(col)
-
-        # Check for negative values
-        for col in numeric_columns:
-            if (df[col] < 0).any():
-                validation_results['negative_values'].append(col)
-
-        # Check for zero values in critical columns
-        critical_columns = ['planned_production_time', 'operating_time', 'total_count']
-        for col in critical_columns:
-            if (df[col] == 0).any():
-                validation_results['zero_values'].append(col)
-
-        # Check data consistency
-        if 'operating_time' in df.columns and 'planned_production_time' in df.columns:
-            if (df['operating_time'] > df['planned_production_time']).any():
-                validation_results['data_consistency'].append('Operating time exceeds planned production time')
-
-        if 'good_count' in df.columns and 'total_count' in df.columns:
-            if (df['good_count'] > df['total_count']).any():
-                validation_results['data_consistency'].append('Good count exceeds total count')
-
-        # Check if any validation errors occurred
-        has_errors = any(len(value) > 0 for value in validation_results.values())
-        
-        return not has_errors, validation_results
+    @staticmethod
+    def validate_data(df: pd.DataFrame, fail_fast: bool = False,
+                      max_offending_rows: int = MAX_OFFENDING_ROWS) -> Tuple[bool, Dict]:
+        """
+        Validate the Excel data structure and content in a single pass
+        Returns: (is_valid, validation_results)
+        """
+        report = ValidationReport(fail_fast=fail_fast, max_offending_rows=max_offending_rows)
+        report.update(df)
+        return report.is_valid, report.results
+
+    @staticmethod
+    def _row_hint(validation_results: Dict, rule: str) -> str:
+        rows = validation_results.get('offending_rows', {}).get(rule)
+        return f" (rows {', '.join(str(row + FIRST_DATA_ROW) for row in rows)})" if rows else ""
 
     @staticmethod
     def get_validation_message(validation_results: Dict) -> str:
@@ -77,12 +143,17 @@ class DataValidator:
             messages.append(f"Invalid data types in columns: {', '.join(validation_results['invalid_data_types'])}")
 
         if validation_results['negative_values']:
-            messages.append(f"Negative values found in columns: {', '.join(validation_results['negative_values'])}")
+            columns = [f"{col}{DataValidator._row_hint(validation_results, f'negative:{col}')}"
+                       for col in validation_results['negative_values']]
+            messages.append(f"Negative values found in columns: {', '.join(columns)}")
 
         if validation_results['zero_values']:
-            messages.append(f"Zero values found in critical columns: {', '.join(validation_results['zero_values'])}")
+            columns = [f"{col}{DataValidator._row_hint(validation_results, f'zero:{col}')}"
+                       for col in validation_results['zero_values']]
+            messages.append(f"Zero values found in critical columns: {', '.join(columns)}")
 
-        if validation_results['data_consistency']:
-            messages.extend(validation_results['data_consistency'])
+        for left, right, message in CONSISTENCY_RULES:
+            if message in validation_results['data_consistency']:
+                messages.append(f"{message}{DataValidator._row_hint(validation_results, f'{left}>{right}')}")
 
-        return "\n".join(messages) if messages else "Data validation successful" 
\ No newline at end of file
+        return "\n".join(messages) if messages else "Data validation successful"
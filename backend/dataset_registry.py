@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from data_processor import DataProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetRegistry:
+    """
+    Holds the current DataProcessor and swaps in new datasets atomically.
+
+    Readers take a snapshot and keep using that processor for the whole
+    request, even if a newer dataset is published meanwhile. Published
+    processors are never modified; writers build a replacement in the
+    background (see DataProcessor.copy) and publish it in one swap. The
+    registry counts in-flight readers per version, and releases a replaced
+    dataset (see DataProcessor.release) once its last reader is done.
+    """
+
+    def __init__(self, processor: Optional[DataProcessor] = None):
+        self._current = processor
+        self._lock = threading.Lock()
+        self._readers: Dict[int, int] = {}
+        # Serializes writers so an append always builds on the latest dataset
+        self.write_lock = asyncio.Lock()
+
+    def current(self) -> Optional[DataProcessor]:
+        return self._current
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Optional[DataProcessor]]:
+        """Pin the current dataset for the duration of a request"""
+        with self._lock:
+            processor = self._current
+            if processor is not None:
+                self._readers[processor.version] = self._readers.get(processor.version, 0) + 1
+        try:
+            yield processor
+        finally:
+            if processor is not None:
+                self._release(processor)
+
+    def _release(self, processor: DataProcessor):
+        with self._lock:
+            remaining = self._readers[processor.version] - 1
+            if remaining:
+                self._readers[processor.version] = remaining
+                return
+            del self._readers[processor.version]
+            retired = self._current is not processor
+        if retired:
+            processor.release()
+            logger.debug("Released dataset snapshot version %s", processor.version)
+
+    def publish(self, processor: DataProcessor) -> Optional[DataProcessor]:
+        """Atomically make processor the current dataset and return the previous one"""
+        with self._lock:
+            previous, self._current = self._current, processor
+            idle = previous is not None and previous is not processor and previous.version not in self._readers
+        if idle:
+            previous.release()
+        logger.debug("Published dataset version %s", processor.version)
+        return previous
+
+    def retired_readers(self) -> int:
+        """Readers still holding a snapshot of a dataset that has since been replaced"""
+        with self._lock:
+            current = self._current.version if self._current is not None else None
+            return sum(count for version, count in self._readers.items() if version != current)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self._current.version if self._current is not None else None,
+                "in_flight_readers": dict(self._readers)
+            }
@@ -0,0 +1,78 @@
+import io
+import itertools
+import zlib
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    ipc = None
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow')
+}
+
+
+def _iter_csv(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    for i, batch in enumerate(frames):
+        if i == 0 or not batch.empty:
+            yield batch.to_csv(index=False, header=i == 0).encode()
+
+
+def _iter_ndjson(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    # pandas' built-in C JSON encoder writes a whole batch per call
+    for batch in frames:
+        if not batch.empty:
+            text = batch.to_json(orient='records', lines=True)
+            yield (text if text.endswith('\n') else text + '\n').encode()
+
+
+def _iter_arrow(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """Arrow IPC stream: the schema of the first frame, then one record batch per frame, flushed as it is written"""
+    frames = iter(frames)
+    first = next(frames)
+    sink = io.BytesIO()
+    schema = pa.Schema.from_pandas(first, preserve_index=False)
+    with ipc.new_stream(sink, schema) as writer:
+        for batch in itertools.chain([first], frames):
+            writer.write_batch(pa.RecordBatch.from_pandas(batch, schema=schema, preserve_index=False))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def iter_export(frames: Iterable[pd.DataFrame], file_format: str) -> Iterator[bytes]:
+    """
+    Serialize OEE frames (see DataProcessor.oee_frames, which yields at least
+    one) as they arrive, so only one encoded batch is held in memory at a
+    time however many rows are exported.
+    The format is checked immediately; encoding happens as the stream is consumed.
+    """
+    check_format(file_format)
+    encoder = {'csv': _iter_csv, 'ndjson': _iter_ndjson, 'arrow': _iter_arrow}[file_format]
+    return encoder(frames)
+
+
+def check_format(file_format: str):
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format} (use one of {', '.join(EXPORT_FORMATS)})")
+    if file_format == 'arrow' and pa is None:
+        raise ValueError("Arrow export requires pyarrow")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream incrementally into gzip format"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,126 @@
+import bisect
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FILTER_FIELDS = ('device_ids', 'locations', 'months')
+# Facet dimensions and the filter field each one populates
+FACETS = (('device_id', 'device_ids'), ('location', 'locations'), ('month', 'months'))
+
+
+class FilterIndex:
+    """
+    Sorted filter values for one dataset version.
+
+    Built once per dataset, it answers case-insensitive prefix searches with
+    a binary search and pages through the matches, so large cardinalities
+    never need to be scanned or sent whole. The digest identifies the
+    contents and serves as the HTTP ETag.
+    """
+
+    def __init__(self, filters: Dict[str, List]):
+        self._values: Dict[str, List] = {}
+        self._keys: Dict[str, List[str]] = {}
+        for field in FILTER_FIELDS:
+            values = sorted(filters.get(field, []), key=lambda value: str(value).casefold())
+            self._values[field] = values
+            self._keys[field] = [str(value).casefold() for value in values]
+        self.digest = hashlib.sha1(
+            json.dumps(self._values, sort_keys=True, default=str).encode()).hexdigest()
+
+    def etag(self, **query) -> str:
+        """Quoted ETag of a response built from this index with the given query parameters"""
+        key = json.dumps([self.digest, query], sort_keys=True, default=str)
+        return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    def as_dict(self) -> Dict[str, List]:
+        return {field: list(values) for field, values in self._values.items()}
+
+    def counts(self) -> Dict[str, int]:
+        return {field: len(values) for field, values in self._values.items()}
+
+    def search(self, field: str, prefix: str = "", offset: int = 0, limit: Optional[int] = None) -> Dict:
+        """Page through the values of field starting with prefix (case-insensitive)"""
+        if field not in self._values:
+            raise ValueError(f"Unknown filter field: {field}")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative")
+
+        keys = self._keys[field]
+        prefix_key = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix_key)
+        # Every key starting with the prefix sorts before prefix + the highest code point
+        end = bisect.bisect_left(keys, prefix_key + '\U0010ffff', lo=start) if prefix_key else len(keys)
+        first = min(start + offset, end)
+        last = end if limit is None else min(first + limit, end)
+        return {
+            "field": field,
+            "prefix": prefix,
+            "total": end - start,
+            "offset": offset,
+            "limit": limit,
+            "values": self._values[field][first:last]
+        }
+
+
+class FacetIndex:
+    """
+    Which (device_id, location, month) combinations hold data.
+
+    Each dimension value maps to a sorted array of the cells it occurs in (an
+    inverted index), so facet queries intersect a few small arrays instead
+    of scanning rows, and combinations that hold no data are recognised
+    without touching the dataset.
+    """
+
+    def __init__(self, keys: pd.DataFrame):
+        self.size = len(keys)
+        self._codes: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, pd.Index] = {}
+        self._postings: Dict[str, List[np.ndarray]] = {}
+        for dim, _ in FACETS:
+            codes, values = pd.factorize(keys[dim].astype(str), sort=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            self._codes[dim] = codes
+            self._values[dim] = pd.Index(values)
+            self._postings[dim] = [order[bounds[i]:bounds[i + 1]] for i in range(len(values))]
+
+    def _cells(self, filters: Dict[str, Optional[str]], skip: Optional[str] = None) -> Optional[np.ndarray]:
+        """Positions of the cells matching every filter except skip; None means all cells"""
+        cells = None
+        for dim, value in filters.items():
+            if not value or dim == skip:
+                continue
+            try:
+                posting = self._postings[dim][self._values[dim].get_loc(value)]
+            except KeyError:
+                return np.empty(0, dtype=np.intp)
+            cells = posting if cells is None else np.intersect1d(cells, posting, assume_unique=True)
+        return cells
+
+    def exists(self, device_id: Optional[str] = None, location: Optional[str] = None,
+               month: Optional[str] = None) -> bool:
+        """Whether any data matches the filter combination"""
+        cells = self._cells({'device_id': device_id, 'location': location, 'month': month})
+        return self.size > 0 if cells is None else len(cells) > 0
+
+    def facets(self, device_id: Optional[str] = None, location: Optional[str] = None,
+               month: Optional[str] = None) -> Dict:
+        """
+        Values of each dimension that have data in combination with the
+        filters on the other dimensions, e.g. the months and locations that
+        exist for a device.
+        """
+        filters = {'device_id': device_id, 'location': location, 'month': month}
+        result = {}
+        for dim, field in FACETS:
+            cells = self._cells(filters, skip=dim)
+            codes = self._codes[dim] if cells is None else self._codes[dim][cells]
+            result[field] = self._values[dim][np.unique(codes)].tolist()
+        matching = self._cells(filters)
+        result["cells"] = self.size if matching is None else len(matching)
+        return result
@@ -1,136 +1,297 @@
+"""
+Generate synthetic OEE data, vectorized and in chunks so it scales to the
+tens of millions of rows needed for load testing:
+
+    python generate_sample_data.py
+    python generate_sample_data.py --devices 20000 --locations 20 --months 24 \
+        --seed 7 --output data/load_test.parquet
+
+Output is reproducible for a given seed, whatever --chunk-rows is.
+"""
+import argparse
+import os
+from typing import Dict, Iterator, List, Optional
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import os
 
-def generate_sample_data():
-    # Create more comprehensive sample data
-    devices = [
-        'PACK001', 'PACK002', 'PACK003',  # Primary packaging lines
-        'WRAP001', 'WRAP002',             # Wrapping machines
-        'SEAL001', 'SEAL002', 'SEAL003'   # Sealing machines
-    ]
-    
-    locations = [
-        'PRODUCTION_LINE_1',
-        'PRODUCTION_LINE_2',
-        'PRODUCTION_LINE_3',
-        'QUALITY_CONTROL',
-        'FINAL_PACKAGING'
-    ]
-    
-    # Generate months for both 2024 and 2025
-    months = [f'2024-{str(i).zfill(2)}' for i in range(1, 13)] + [f'2025-{str(i).zfill(2)}' for i in range(1, 13)]
-    
-    data = []
-    
-    # Define performance profiles for different device types
-    performance_profiles = {
-        'PACK': {'base_availability': 0.85, 'base_performance': 0.90, 'base_quality': 0.95},
-        'WRAP': {'base_availability': 0.80, 'base_performance': 0.85, 'base_quality': 0.92},
-        'SEAL': {'base_availability': 0.75, 'base_performance': 0.80, 'base_quality': 0.90}
-    }
-
-    # Define yearly improvement factors (slight improvement in 2025)
-    yearly_improvement = {
-        2024: 1.0,
-        2025: 1.05  # 5% improvement in base metrics for 2025
-    }
-    
-    for device in devices:
-        device_type = device[:4]  # Get device type prefix
-        profile = performance_profiles[device_type]
-        
-        for location in locations:
-            for month in months:
-                year = int(month.split('-')[0])
-                month_num = int(month.split('-')[1])
-                
-                # Apply yearly improvement factor
-                improvement_factor = yearly_improvement[year]
-                
-                # Base values with yearly improvement
-                planned_production_time = np.random.uniform(400, 500)  # hours
-                
-                # Apply seasonal variation (lower in summer months)
-                seasonal_factor = 1.0
-                if 6 <= month_num <= 8:  # Summer months
-                    seasonal_factor = 0.9
-                
-                # Calculate operating time with maintenance periods
-                maintenance_probability = 0.1  # 10% chance of maintenance
-                has_maintenance = np.random.random() < maintenance_probability
-                
-                if has_maintenance:
-                    maintenance_hours = np.random.uniform(20, 40)
-                    operating_time = (planned_production_time - maintenance_hours) * seasonal_factor
-                else:
-                    operating_time = planned_production_time * seasonal_factor * profile['base_availability'] * improvement_factor
-                
-                # Calculate ideal cycle time based on device type (improved in 2025)
-                base_cycle_time = {
-                    'PACK': np.random.uniform(0.5, 1.0),
-                    'WRAP': np.random.uniform(0.8, 1.5),
-                    'SEAL': np.random.uniform(1.0, 2.0)
-                }[device_type]
-                
-                ideal_cycle_time = base_cycle_time / improvement_factor  # Better cycle time in 2025
-                
-                # Calculate counts with quality variations
-                total_count = int(operating_time * 60 / ideal_cycle_time)
-                
-                # Simulate quality issues with reduced probability in 2025
-                quality_issue_probability = 0.05 / improvement_factor  # Lower probability in 2025
-                has_quality_issues = np.random.random() < quality_issue_probability
-                
-                if has_quality_issues:
-                    quality_factor = np.random.uniform(0.7, 0.9)
-                else:
-                    quality_factor = profile['base_quality'] * improvement_factor
-                
-                good_count = int(total_count * quality_factor)
-                
-                # Add some random variation to make data more realistic
-                operating_time = operating_time * np.random.uniform(0.95, 1.05)
-                total_count = int(total_count * np.random.uniform(0.98, 1.02))
-                good_count = int(good_count * np.random.uniform(0.98, 1.02))
-                
-                data.append({
-                    'device_id': device,
-                    'location': location,
-                    'month': month,
-                    'planned_production_time': round(planned_production_time, 2),
-                    'operating_time': round(operating_time, 2),
-                    'total_count': total_count,
-                    'good_count': good_count,
-                    'ideal_cycle_time': round(ideal_cycle_time, 2),
-                    'has_maintenance': has_maintenance,
-                    'has_quality_issues': has_quality_issues
-                })
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Create data directory if it doesn't exist
-    os.makedirs('data', exist_ok=True)
-    
-    # Save to Excel
-    file_path = 'data/sample_oee_data.xlsx'
-    df.to_excel(file_path, index=False)
-    
-    # Generate summary statistics
-    summary = df.groupby(['device_id', 'month']).agg({
-        'planned_production_time': 'mean',
-        'operating_time': 'mean',
-        'total_count': 'sum',
-        'good_count': 'sum',
-        'has_maintenance': 'sum',
-        'has_quality_issues': 'sum'
-    }).round(2)
-    
-    print(f"Sample data generated and saved to {file_path}")
-    print("\nSummary Statistics:")
-    print(summary.head(15))  # Show first 15 rows of summary
+DEFAULT_DEVICES = [
+    'PACK001', 'PACK002', 'PACK003',  # Primary packaging lines
+    'WRAP001', 'WRAP002',             # Wrapping machines
+    'SEAL001', 'SEAL002', 'SEAL003'   # Sealing machines
+]
+
+DEFAULT_LOCATIONS = [
+    'PRODUCTION_LINE_1',
+    'PRODUCTION_LINE_2',
+    'PRODUCTION_LINE_3',
+    'QUALITY_CONTROL',
+    'FINAL_PACKAGING'
+]
+
+DEVICE_TYPES = ['PACK', 'WRAP', 'SEAL']
+
+# Performance profiles for the different device types
+PERFORMANCE_PROFILES = {
+    'PACK': {'base_availability': 0.85, 'base_performance': 0.90, 'base_quality': 0.95},
+    'WRAP': {'base_availability': 0.80, 'base_performance': 0.85, 'base_quality': 0.92},
+    'SEAL': {'base_availability': 0.75, 'base_performance': 0.80, 'base_quality': 0.90}
+}
+
+# Ideal cycle time range per device type, in minutes
+CYCLE_TIME_RANGES = {
+    'PACK': (0.5, 1.0),
+    'WRAP': (0.8, 1.5),
+    'SEAL': (1.0, 2.0)
+}
+
+# Yearly improvement factors (5% better base metrics in 2025); earlier years keep the
+# 2024 baseline and later years the last factor, see yearly_improvement()
+YEARLY_IMPROVEMENT = {
+    2024: 1.0,
+    2025: 1.05
+}
+
+MAINTENANCE_PROBABILITY = 0.1
+QUALITY_ISSUE_PROBABILITY = 0.05
+SUMMER_MONTHS = (6, 8)
+SUMMER_FACTOR = 0.9
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+# Devices drawn from one random stream; chunks hold whole blocks so output does not depend on chunk size
+RNG_BLOCK_DEVICES = 256
+EXCEL_ROW_LIMIT = 1048575  # data rows per sheet, below the header
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+def make_devices(n_devices: int = None):
+    """Device IDs cycling through the PACK/WRAP/SEAL types"""
+    if n_devices is None:
+        return list(DEFAULT_DEVICES)
+    return [f"{DEVICE_TYPES[i % 3]}{i // 3 + 1:03d}" for i in range(n_devices)]
+
+def make_locations(n_locations: int = None):
+    """The default locations, extended with numbered production lines"""
+    if n_locations is None:
+        return list(DEFAULT_LOCATIONS)
+    extra = [f'PRODUCTION_LINE_{i}' for i in range(4, n_locations - 1)]
+    return (DEFAULT_LOCATIONS + extra)[:n_locations]
+
+def make_months(n_months: int = None, start_year: int = 2024):
+    """Consecutive YYYY-MM months starting in January of start_year"""
+    n_months = 24 if n_months is None else n_months
+    return [f'{start_year + i // 12}-{str(i % 12 + 1).zfill(2)}' for i in range(n_months)]
+
+def yearly_improvement(year: int) -> float:
+    """Improvement factor of a year, clamped to the years in YEARLY_IMPROVEMENT"""
+    return YEARLY_IMPROVEMENT[min(max(year, min(YEARLY_IMPROVEMENT)), max(YEARLY_IMPROVEMENT))]
+
+def _by_type(values: Dict[str, float]) -> np.ndarray:
+    return np.array([values[device_type] for device_type in DEVICE_TYPES])
+
+def _build_block(rng: np.random.Generator, device_codes: np.ndarray, type_codes: np.ndarray,
+                 devices: List[str], locations: List[str], months: List[str]) -> pd.DataFrame:
+    """One row per (device, location, month) for a block of devices, drawn with array operations"""
+    n_cells = len(locations) * len(months)
+    n = len(device_codes) * n_cells
+    device = np.repeat(device_codes, n_cells)
+    device_type = np.repeat(type_codes[device_codes], n_cells)
+    location = np.tile(np.repeat(np.arange(len(locations)), len(months)), len(device_codes))
+    month = np.tile(np.arange(len(months)), len(device_codes) * len(locations))
+
+    years = np.array([int(m.split('-')[0]) for m in months])
+    month_numbers = np.array([int(m.split('-')[1]) for m in months])
+    improvement = np.array([yearly_improvement(year) for year in years])[month]
+    # Seasonal variation: lower output in summer months
+    seasonal = np.where((month_numbers >= SUMMER_MONTHS[0]) & (month_numbers <= SUMMER_MONTHS[1]),
+                        SUMMER_FACTOR, 1.0)[month]
+
+    planned_production_time = rng.uniform(400, 500, n)  # hours
+
+    # Operating time with occasional maintenance periods
+    has_maintenance = rng.random(n) < MAINTENANCE_PROBABILITY
+    maintenance_hours = rng.uniform(20, 40, n)
+    availability = _by_type({t: p['base_availability'] for t, p in PERFORMANCE_PROFILES.items()})[device_type]
+    operating_time = np.where(has_maintenance,
+                              (planned_production_time - maintenance_hours) * seasonal,
+                              planned_production_time * seasonal * availability * improvement)
+
+    # Ideal cycle time by device type, improving with the yearly factor
+    low = _by_type({t: r[0] for t, r in CYCLE_TIME_RANGES.items()})[device_type]
+    high = _by_type({t: r[1] for t, r in CYCLE_TIME_RANGES.items()})[device_type]
+    ideal_cycle_time = rng.uniform(low, high) / improvement
+
+    total_count = np.trunc(operating_time * 60 / ideal_cycle_time)
+
+    # Quality issues become less likely as the yearly factor improves
+    has_quality_issues = rng.random(n) < QUALITY_ISSUE_PROBABILITY / improvement
+    base_quality = _by_type({t: p['base_quality'] for t, p in PERFORMANCE_PROFILES.items()})[device_type]
+    quality_factor = np.where(has_quality_issues, rng.uniform(0.7, 0.9, n), base_quality * improvement)
+    good_count = np.trunc(total_count * quality_factor)
+
+    # Random variation to make the data more realistic, kept within what the validator accepts:
+    # operating time never exceeds planned time and good parts never exceed total parts
+    operating_time = np.minimum(operating_time * rng.uniform(0.95, 1.05, n), planned_production_time)
+    total_count = np.trunc(total_count * rng.uniform(0.98, 1.02, n))
+    good_count = np.minimum(np.trunc(good_count * rng.uniform(0.98, 1.02, n)), total_count)
+
+    return pd.DataFrame({
+        'device_id': pd.Categorical.from_codes(device, categories=devices),
+        'location': pd.Categorical.from_codes(location, categories=locations),
+        'month': pd.Categorical.from_codes(month, categories=months),
+        'planned_production_time': np.round(planned_production_time, 2),
+        'operating_time': np.round(operating_time, 2),
+        'total_count': total_count.astype(np.int64),
+        'good_count': good_count.astype(np.int64),
+        'ideal_cycle_time': np.round(ideal_cycle_time, 2),
+        'has_maintenance': has_maintenance,
+        'has_quality_issues': has_quality_issues
+    })
+
+def iter_sample_chunks(n_devices: int = None, n_locations: int = None, n_months: int = None,
+                       seed: int = None, chunk_rows: Optional[int] = DEFAULT_CHUNK_ROWS,
+                       start_year: int = 2024) -> Iterator[pd.DataFrame]:
+    """
+    Yield the sample data in frames of about chunk_rows rows (whole blocks of
+    RNG_BLOCK_DEVICES devices per frame), so arbitrarily large datasets never
+    have to fit in memory. Each block draws from its own stream derived from
+    (seed, block index), so the rows are the same for any chunk_rows.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    devices = make_devices(n_devices)
+    locations = make_locations(n_locations)
+    months = make_months(n_months, start_year)
+    type_codes = np.array([DEVICE_TYPES.index(device[:4]) for device in devices])
+
+    rows_per_block = max(1, len(locations) * len(months)) * RNG_BLOCK_DEVICES
+    blocks_per_chunk = max(1, chunk_rows // rows_per_block) if chunk_rows else None
+    n_blocks = -(-len(devices) // RNG_BLOCK_DEVICES)
+    frames = []
+    for block in range(n_blocks):
+        rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(block,)))
+        start = block * RNG_BLOCK_DEVICES
+        device_codes = np.arange(start, min(start + RNG_BLOCK_DEVICES, len(devices)))
+        frames.append(_build_block(rng, device_codes, type_codes, devices, locations, months))
+        if len(frames) == blocks_per_chunk or block == n_blocks - 1:
+            yield pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            frames = []
+
+def build_sample_frame(n_devices: int = None, n_locations: int = None,
+                       n_months: int = None, seed: int = None) -> pd.DataFrame:
+    """Build one row of OEE data per device, location and month"""
+    return next(iter_sample_chunks(n_devices, n_locations, n_months, seed=seed, chunk_rows=None))
+
+def _write_csv(chunks: Iterator[pd.DataFrame], path: str) -> Iterator[pd.DataFrame]:
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        yield chunk
+
+def _write_parquet(chunks: Iterator[pd.DataFrame], path: str) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("pyarrow is required for Parquet output")
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)  # one row group per chunk
+            yield chunk
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_xlsx(chunks: Iterator[pd.DataFrame], path: str) -> Iterator[pd.DataFrame]:
+    """Stream rows into a write-only workbook, starting a new sheet when one is full"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, EXCEL_ROW_LIMIT
+    for chunk in chunks:
+        for row in chunk.astype(object).itertuples(index=False, name=None):
+            if sheet_rows >= EXCEL_ROW_LIMIT:
+                sheet = workbook.create_sheet('data' if sheet is None else f'data_{len(workbook.worksheets) + 1}')
+                sheet.append(list(chunk.columns))
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+        yield chunk
+    workbook.save(path)
+
+WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}
+
+def iter_written_chunks(path: str, n_devices: int = None, n_locations: int = None, n_months: int = None,
+                        seed: int = None, file_format: str = None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                        start_year: int = 2024) -> Iterator[pd.DataFrame]:
+    """
+    Generate sample data chunk by chunk into a CSV, Parquet or Excel file
+    (format from file_format or the extension), yielding each chunk once written.
+    Nothing is written until the chunks are consumed, and the file is only
+    complete once all of them are. Workbooks larger than one sheet continue
+    on further sheets.
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format not in WRITERS:
+        raise ValueError(f"Unsupported output format: {file_format or path} (use one of {', '.join(FORMATS)})")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    chunks = iter_sample_chunks(n_devices, n_locations, n_months, seed=seed, chunk_rows=chunk_rows,
+                                start_year=start_year)
+    return WRITERS[file_format](chunks, path)
+
+def write_sample_data(path: str, **options) -> int:
+    """
+    Write the whole sample data file, as iter_written_chunks with the same options.
+    Returns: the number of rows written
+    """
+    return sum(len(chunk) for chunk in iter_written_chunks(path, **options))
+
+def generate_sample_data(path: str = 'data/sample_oee_data.xlsx', summary: bool = True, **options):
+    total_rows = 0
+    partial_summaries = []
+    for chunk in iter_written_chunks(path, **options):
+        total_rows += len(chunk)
+        if summary:
+            # Sums and counts combine across chunks; means are derived at the end
+            grouped = chunk.groupby(['device_id', 'month'], observed=True)
+            partial_summaries.append(grouped.agg(
+                planned_production_time=('planned_production_time', 'sum'),
+                operating_time=('operating_time', 'sum'),
+                total_count=('total_count', 'sum'),
+                good_count=('good_count', 'sum'),
+                has_maintenance=('has_maintenance', 'sum'),
+                has_quality_issues=('has_quality_issues', 'sum'),
+                rows=('total_count', 'size')
+            ))
+
+    print(f"Sample data generated and saved to {path} ({total_rows} rows)")
+    if summary and partial_summaries:
+        combined = pd.concat(partial_summaries).groupby(level=['device_id', 'month'], observed=True).sum()
+        for col in ('planned_production_time', 'operating_time'):
+            combined[col] = combined[col] / combined['rows']
+        print("\nSummary Statistics:")
+        print(combined.drop(columns='rows').round(2).head(15))  # Show first 15 rows of summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic OEE data")
+    parser.add_argument("--devices", type=int, help="number of devices (default: the 8 sample devices)")
+    parser.add_argument("--locations", type=int, help="number of locations (default: the 5 sample locations)")
+    parser.add_argument("--months", type=int, default=24, help="consecutive months to generate")
+    parser.add_argument("--start-year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, help="random seed for reproducible output")
+    parser.add_argument("--output", default="data/sample_oee_data.xlsx")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the --output extension)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows generated per chunk")
+    parser.add_argument("--no-summary", dest="summary", action="store_false", help="skip the summary table")
+    args = parser.parse_args()
+
+    generate_sample_data(args.output, summary=args.summary, n_devices=args.devices,
+                         n_locations=args.locations, n_months=args.months, seed=args.seed,
+                         file_format=args.format, chunk_rows=args.chunk_rows, start_year=args.start_year)
 
 if __name__ == "__main__":
-    generate_sample_data() 
\ No newline at end of file
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+from fastapi import UploadFile
+from openpyxl import load_workbook
+
+from data_cache import DataCache
+from data_processor import DataProcessor
+from data_validator import DataValidator, ValidationReport
+from metrics import span, timed
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # bytes read from the request per iteration
+ROW_CHUNK_SIZE = 50000       # rows parsed and validated per chunk
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+CSV_EXTENSIONS = ('.csv', '.txt')
+SNIFF_BYTES = 8192           # bytes inspected to tell a file's real type
+ZIP_MAGIC = b'PK\x03\x04'    # .xlsx/.xlsm workbooks are zip archives
+
+
+class IngestionError(Exception):
+    """Raised when an uploaded file fails validation"""
+
+    def __init__(self, validation_results: Dict):
+        self.validation_results = validation_results
+        super().__init__(DataValidator.get_validation_message(validation_results))
+
+    def __reduce__(self):
+        # Rebuild from the results so the error survives the trip back from a process pool
+        return IngestionError, (self.validation_results,)
+
+
+async def save_upload(file: UploadFile, destination: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Stream an upload to disk in fixed-size chunks.
+    Returns: SHA-256 hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(destination, "wb") as buffer:
+        while True:
+            block = await file.read(chunk_size)
+            if not block:
+                break
+            digest.update(block)
+            buffer.write(block)
+    return digest.hexdigest()
+
+
+def iter_excel_chunks(path: str, chunk_size: int = ROW_CHUNK_SIZE,
+                      sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Yield frames of a worksheet (the first by default) using openpyxl's read-only row iterator"""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        batch: List[tuple] = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_csv_chunks(path: str, chunk_size: int = ROW_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield frames of a CSV file using pandas' chunked reader"""
+    with pd.read_csv(path, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def iter_chunks(path: str, chunk_size: int = ROW_CHUNK_SIZE, sheet: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """Pick the chunked reader that matches the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXCEL_EXTENSIONS:
+        return iter_excel_chunks(path, chunk_size, sheet=sheet)
+    if extension in CSV_EXTENSIONS:
+        if sheet is not None:
+            raise ValueError(f"CSV files have no sheets: {os.path.basename(path)}")
+        return iter_csv_chunks(path, chunk_size)
+    raise ValueError(f"Unsupported file type: {extension or path}")
+
+
+def check_file_type(name: str):
+    """Reject a file by its extension alone, before anything is read or parsed"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in EXCEL_EXTENSIONS + CSV_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {extension or name}")
+
+
+def check_file_contents(path: str, name: Optional[str] = None):
+    """
+    Reject a file that is empty or whose first bytes do not match its
+    extension: workbooks must be zip archives and CSV files must be text
+    """
+    name = name or os.path.basename(path)
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    if not head:
+        raise ValueError(f"Empty file: {name}")
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXCEL_EXTENSIONS and not head.startswith(ZIP_MAGIC):
+        raise ValueError(f"Unsupported file type: {name} is not an Excel workbook")
+    if extension in CSV_EXTENSIONS and b'\x00' in head:
+        raise ValueError(f"Unsupported file type: {name} is not a text CSV file")
+
+
+def list_sheets(path: str) -> List[Optional[str]]:
+    """Sheet names of a workbook, or [None] for a CSV file, for importing each sheet separately"""
+    check_file_type(path)
+    if os.path.splitext(path)[1].lower() in CSV_EXTENSIONS:
+        return [None]
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+@timed("ingest")
+def ingest_file(path: str, cache: Optional[DataCache] = None, digest: Optional[str] = None,
+                chunk_size: int = ROW_CHUNK_SIZE, fail_fast: bool = True,
+                compact: bool = False, sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    Parse, validate and type an OEE file (or one sheet of a workbook) in a single pass.
+    Each chunk is validated as soon as it is read, and with fail_fast parsing
+    stops at the first chunk with errors; a cached copy of an identical file
+    is reused without parsing at all.
+    Returns: the typed frame, ready for DataProcessor.from_frame
+    """
+    # The cache holds one frame per file, so individual sheets bypass it
+    cache = cache if sheet is None else None
+    cached = cache.load(path, digest=digest, compact=compact) if cache else None
+    if cached is not None:
+        is_valid, validation_results = DataValidator.validate_data(cached)
+        if not is_valid:
+            raise IngestionError(validation_results)
+        return cached
+
+    report = ValidationReport(fail_fast=fail_fast)
+    chunks = []
+    for chunk in iter_chunks(path, chunk_size, sheet=sheet):
+        with span("validate"):
+            valid = report.update(chunk)
+        if not valid:
+            raise IngestionError(report.results)
+        chunks.append(chunk)
+        logger.debug("Ingested chunk of %d rows from %s", len(chunk), path)
+
+    if not chunks:
+        raise ValueError(f"No data rows found in {os.path.basename(path)}")
+    if not report.is_valid:
+        raise IngestionError(report.results)
+
+    df = DataProcessor.prepare_frame(pd.concat(chunks, ignore_index=True), compact=compact)
+    if cache:
+        cache.store(path, df, digest=digest, compact=compact)
+    return df
+
+
+@timed("ingest")
+def ingest_to_store(path: str, store, chunk_size: int = ROW_CHUNK_SIZE,
+                    fail_fast: bool = True, compact: bool = False) -> int:
+    """
+    Stream an OEE file into a storage backend (PartitionedStore or SQLiteStore)
+    one chunk at a time, so the whole file is never held in memory. Each chunk
+    is validated before it is written. Meant for a staging store: rows are
+    written as they are and deduplicated when the caller merges the staging
+    store into the dataset (see merge_staged).
+    Returns: the number of rows ingested
+    """
+    report = ValidationReport(fail_fast=fail_fast)
+    rows = 0
+    for chunk in iter_chunks(path, chunk_size):
+        with span("validate"):
+            valid = report.update(chunk)
+        if not valid:
+            raise IngestionError(report.results)
+
+        rows += store.add(DataProcessor.prepare_frame(chunk, compact=compact))
+        logger.debug("Stored chunk of %d rows from %s", len(chunk), path)
+
+    if not rows:
+        raise ValueError(f"No data rows found in {os.path.basename(path)}")
+    if not report.is_valid:
+        raise IngestionError(report.results)
+    return rows
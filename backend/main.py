@@ -1,15 +1,50 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
-from typing import Optional
+from typing import Dict, Iterator, List, Optional
 import os
+import asyncio
+import logging
+import time
+from contextlib import ExitStack, asynccontextmanager, nullcontext, suppress
+from functools import lru_cache
 from datetime import datetime
 from data_processor import DataProcessor
-from data_validator import DataValidator
+from data_cache import DataCache
 from query_processor import QueryProcessor
+from ingestion import IngestionError, check_file_contents, check_file_type, ingest_file, ingest_to_store, list_sheets, save_upload
+from partitioned_store import PartitionedStore
+from sqlite_store import SQLiteStore
+from result_cache import MISSING, ResultCache
+from workers import JobManager, WorkerPool, pool_size
+from dataset_registry import DatasetRegistry
+from export import EXPORT_FORMATS, check_format, gzip_stream, iter_export
+from metrics import (REGISTRY, REQUEST_SECONDS, profile_report, profile_request, server_timing, span,
+                     start_request_spans)
+import uuid
 
-app = FastAPI()
+logging.basicConfig(level=os.getenv("OEE_LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requests never check the shared file themselves; a background task picks up
+    # other workers' commits and publishes them, so this worker lags by one poll at most
+    poll = asyncio.create_task(follow_shared_store()) if STORAGE_BACKEND == "sqlite" else None
+    try:
+        yield
+    finally:
+        if poll is not None:
+            poll.cancel()
+            with suppress(asyncio.CancelledError):
+                await poll
+        compute_pool.shutdown()
+        ingest_pool.shutdown()
+        bulk_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -18,69 +53,504 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "ETag"],
 )
 
 # Initialize components with sample data
-SAMPLE_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "sample_oee_data.xlsx")
-data_processor = DataProcessor(SAMPLE_DATA_PATH) if os.path.exists(SAMPLE_DATA_PATH) else None
-query_processor = QueryProcessor()
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SAMPLE_DATA_PATH = os.path.join(DATA_DIR, "sample_oee_data.xlsx")
+data_cache = DataCache(os.getenv("OEE_CACHE_DIR", os.path.join(DATA_DIR, ".cache")))
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+# Compact storage downcasts numeric columns and shares memory-mapped cache pages across workers.
+# Float measures are stored as float32, which is lossy (about seven significant digits).
+COMPACT_STORAGE = os.getenv("OEE_COMPACT_STORAGE", "").lower() in ("1", "true", "yes")
+# Storage backend (OEE_STORAGE_BACKEND):
+# - "memory": the dataset is a DataFrame plus OEE cube, rebuilt from the workbook on start
+# - "partitioned": Arrow files partitioned by month and location under OEE_PARTITION_DIR,
+#   for histories larger than memory
+# - "sqlite": an indexed SQLite database at OEE_SQLITE_PATH, persistent across restarts
+#   and shared by every worker process
+PARTITION_DIR = os.getenv("OEE_PARTITION_DIR")
+SQLITE_PATH = os.getenv("OEE_SQLITE_PATH", os.path.join(DATA_DIR, "oee.sqlite3"))
+STORAGE_BACKEND = os.getenv("OEE_STORAGE_BACKEND", "partitioned" if PARTITION_DIR else "memory").lower()
+if STORAGE_BACKEND not in ("memory", "partitioned", "sqlite"):
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+if STORAGE_BACKEND == "partitioned" and not PARTITION_DIR:
+    raise ValueError("OEE_PARTITION_DIR is required for partitioned storage")
+USE_STORE = STORAGE_BACKEND != "memory"
+STORE_PATH = SQLITE_PATH if STORAGE_BACKEND == "sqlite" else PARTITION_DIR
+
+def open_store():
+    """The committed dataset of the configured storage backend"""
+    return SQLiteStore(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else PartitionedStore.open(PARTITION_DIR)
+
+def new_store():
+    """An empty store whose commit replaces the stored dataset"""
+    return SQLiteStore.empty(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else PartitionedStore(PARTITION_DIR)
+
+def staging_store():
+    """A private store to parse an upload into before it is merged into the dataset"""
+    return SQLiteStore.staging(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else PartitionedStore.staging(PARTITION_DIR)
+
+def load_initial_dataset() -> Optional[DataProcessor]:
+    if not USE_STORE:
+        return (DataProcessor(SAMPLE_DATA_PATH, cache=data_cache, compact=COMPACT_STORAGE)
+                if os.path.exists(SAMPLE_DATA_PATH) else None)
+
+    store = open_store()
+    # Nothing else uses the store yet, so leftovers from unpublished writes and uploads can be dropped
+    store.vacuum(staging=True)
+    if not store.row_count and os.path.exists(SAMPLE_DATA_PATH):
+        df = DataProcessor(SAMPLE_DATA_PATH, cache=data_cache, compact=COMPACT_STORAGE).df
+        # Workers starting together all find the store empty; checking again inside the
+        # write transaction lets only the first of them seed it
+        store.begin()
+        if store.row_count:
+            store.rollback()
+        else:
+            store.add(df)
+            store.commit()
+    return DataProcessor.from_store(store, data_path=STORE_PATH) if store.row_count else None
+
+datasets = DatasetRegistry(load_initial_dataset())
+query_processor = QueryProcessor(datasets.current().get_available_filters() if datasets.current() else None)
+
+# Parsed queries and OEE results, keyed by the dataset version they were computed from
+CACHE_SIZE = int(os.getenv("OEE_RESULT_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("OEE_RESULT_CACHE_TTL", "600"))
+parse_cache = ResultCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+oee_cache = ResultCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+# How often a pending vacuum checks whether superseded datasets still have readers
+VACUUM_POLL_SECONDS = 1.0
+# How often a worker checks the shared SQLite file for commits by other workers
+SHARED_POLL_SECONDS = float(os.getenv("OEE_SHARED_POLL_SECONDS", "1.0"))
+# Strong references to fire-and-forget tasks, which the event loop only holds weakly
+background_tasks = set()
+
+# Blocking pandas/openpyxl work runs on these pools instead of the event loop.
+# Ingestion can use a process pool (OEE_INGEST_EXECUTOR=process) since parsing
+# is CPU-bound; aggregation stays on threads because it reads the shared dataset.
+# Executors start on first use and stop when the app's lifespan ends, so importing
+# this module (as the tests and benchmark.py do) starts no workers.
+compute_pool = WorkerPool(pool_size("OEE_COMPUTE_WORKERS", min(4, os.cpu_count() or 1)))
+ingest_pool = WorkerPool(pool_size("OEE_INGEST_WORKERS", 2), kind=os.getenv("OEE_INGEST_EXECUTOR", "thread"))
+# Bulk imports parse many files and sheets at once, so they get a process pool of their own
+bulk_pool = WorkerPool(pool_size("OEE_BULK_IMPORT_WORKERS", os.cpu_count() or 1), kind="process")
+jobs = JobManager()
+
+# Opt-in cProfile capture (OEE_PROFILING=1), requested per call with ?profile=1 or an X-Profile: 1 header.
+# Meant for debugging one request at a time: the event-loop profiler also records any other
+# request running concurrently, and the report says so when that happened.
+PROFILING_ENABLED = os.getenv("OEE_PROFILING", "").lower() in ("1", "true", "yes")
+profiles = ResultCache(maxsize=32, ttl=3600)
+# Requests being handled and requests started so far, for spotting overlap with a profiled request
+requests_in_flight = 0
+requests_started = 0
+
+@lru_cache(maxsize=None)
+def endpoint_paths() -> Dict:
+    """Path template of every route by endpoint; routes are fixed once the app is built"""
+    return {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+
+def route_template(request: Request) -> str:
+    """
+    The matched route's path template, so metrics are not labelled per device
+    or job id. Read from what routing left in the scope, so no route is matched twice.
+    """
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    return endpoint_paths().get(request.scope.get("endpoint"), "unmatched")
+
+def cache_metrics() -> List[str]:
+    lines = ["# HELP oee_result_cache_requests_total Result cache lookups by outcome",
+             "# TYPE oee_result_cache_requests_total counter"]
+    for name, cache in (("query_parse", parse_cache), ("oee", oee_cache)):
+        stats = cache.stats()
+        for result in ("hits", "misses"):
+            lines.append(f'oee_result_cache_requests_total{{cache="{name}",result="{result}"}} {stats[result]}')
+    return lines
+
+REGISTRY.add_collector(cache_metrics)
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Time every request, expose its hot-path spans as Server-Timing and optionally profile it"""
+    global requests_in_flight, requests_started
+    spans = start_request_spans()
+    wants_profile = PROFILING_ENABLED and "1" in (request.query_params.get("profile"),
+                                                 request.headers.get("x-profile"))
+    already_running, started_before = requests_in_flight, requests_started
+    requests_in_flight += 1
+    requests_started += 1
+    start = time.perf_counter()
+    status = 500
+    try:
+        with (profile_request() if wants_profile else nullcontext()) as request_profiles:
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        requests_in_flight -= 1
+        elapsed = time.perf_counter() - start
+        REQUEST_SECONDS.observe(elapsed, method=request.method, route=route_template(request), status=status)
+
+    spans.append(("total", elapsed))
+    response.headers["Server-Timing"] = server_timing(spans)
+    if request_profiles:
+        report = profile_report(request_profiles)
+        overlapping = already_running + requests_started - started_before - 1
+        if overlapping:
+            report = (f"Note: {overlapping} other requests overlapped with this one; "
+                      f"their event-loop work is included below.\n\n{report}")
+        profile_id = uuid.uuid4().hex
+        profiles.put(profile_id, report)
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+async def follow_shared_store():
+    """With SQLite storage, keep serving what other workers commit to the shared file"""
+    while True:
+        await asyncio.sleep(SHARED_POLL_SECONDS)
+        try:
+            await refresh_shared_dataset()
+        except Exception:
+            logger.exception("Failed to follow the shared SQLite dataset")
+
+def shared_dataset_changed() -> bool:
+    generation, rows = SQLiteStore.committed_state(SQLITE_PATH)
+    current = datasets.current()
+    return current.store.generation != generation if current is not None else rows > 0
+
+async def refresh_shared_dataset():
+    """
+    Publish the SQLite dataset if another worker committed a newer one.
+    Every cached result belongs to the dataset version it was computed from,
+    and each published store reads one snapshot, so caches never mix data
+    from before and after another worker's commit. While a writer of this
+    worker holds the write lock the current dataset is served as it is,
+    since that writer is about to publish a newer one anyway.
+    """
+    if datasets.write_lock.locked() or not await compute_pool.run(shared_dataset_changed):
+        return
+    async with datasets.write_lock:
+        if await compute_pool.run(shared_dataset_changed):
+            store = await compute_pool.run(open_store)
+            await publish_dataset(DataProcessor.from_store(store, data_path=STORE_PATH))
+
+async def publish_dataset(processor: DataProcessor):
+    """Refresh state derived from a fully built dataset, then swap it in"""
+    if processor.store is not None:
+        await compute_pool.run(processor.store.commit)
+    filters = await compute_pool.run(processor.get_available_filters)
+    # Build the facet index before the dataset goes live so no request pays for it
+    await compute_pool.run(processor.facet_index)
+    query_processor.update_vocabulary(filters)
+    datasets.publish(processor)
+    # Old entries can never be hit again once the version changes; drop them early
+    parse_cache.clear()
+    oee_cache.clear()
+    if processor.store is not None:
+        task = asyncio.create_task(vacuum_retired(processor.store))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+async def vacuum_retired(store):
+    """Delete the files of superseded datasets once no request reads them any more"""
+    while datasets.retired_readers():
+        await asyncio.sleep(VACUUM_POLL_SECONDS)
+    async with datasets.write_lock:
+        # A later publish schedules its own vacuum, which would know about newer files
+        current = datasets.current()
+        if current is not None and current.store is store:
+            removed = await compute_pool.run(store.vacuum)
+            logger.debug("Vacuumed %d superseded files", removed)
+
+@asynccontextmanager
+async def store_writes(store):
+    """Roll back a store's pending writes if building the new dataset fails"""
+    try:
+        yield store
+    except Exception:
+        await compute_pool.run(store.rollback)
+        raise
 
 class Query(BaseModel):
     device_id: Optional[str] = None
     location: Optional[str] = None
     month: Optional[str] = None
     message: str
+    # Callers that only want the numbers can skip the natural-language reply
+    include_message: bool = True
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+class QueryFilter(BaseModel):
+    device_id: Optional[str] = None
+    location: Optional[str] = None
+    month: Optional[str] = None
+
+class BatchQuery(BaseModel):
+    filters: List[QueryFilter] = []
+    group_by: List[str] = []
+    device_id: Optional[str] = None
+    location: Optional[str] = None
+    month: Optional[str] = None
+
+async def receive_upload(file: UploadFile):
+    """
+    Stream an uploaded file to disk without buffering it in memory.
+    Each upload gets a unique name so concurrent uploads never share a file.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{os.path.basename(file.filename or 'upload')}")
+    digest = await save_upload(file, file_path)
+    return file_path, digest
+
+async def receive_checked_upload(file: UploadFile):
+    """
+    Receive an upload, rejecting with 400 whatever needs no parsing to reject:
+    an unsupported file type, an empty file or contents that do not match the
+    extension. Anything found while parsing (missing columns, invalid values)
+    is reported by the ingestion job.
+    """
     try:
-        # Save the uploaded file
-        file_path = f"data/{file.filename}"
-        os.makedirs("data", exist_ok=True)
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        check_file_type(file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        file_path, digest = await receive_upload(file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        check_file_contents(file_path, file.filename)
+    except ValueError as e:
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    return file_path, digest
+
+def job_response(job: dict, message: str, file_path: str) -> dict:
+    return {
+        "message": message,
+        "file_path": file_path,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['job_id']}"
+    }
+
+@app.post("/api/upload", status_code=202)
+async def upload_file(file: UploadFile = File(...)):
+    """
+    Replace the dataset with an Excel workbook or CSV file.
+    Responds 202 with a job to poll at status_url; validation errors such as
+    missing columns or negative values are reported by that job as failed.
+    Responds 400 straight away for an unsupported file type or an empty file.
+    """
+    file_path, digest = await receive_checked_upload(file)
+
+    async def ingest_into_store():
+        # Parse into a private staging store without the write lock, so readers and other
+        # writers are only held up while the staged rows are swapped in
+        staging = await compute_pool.run(staging_store)
+        try:
+            await compute_pool.run(ingest_to_store, file_path, staging, compact=COMPACT_STORAGE)
+            async with datasets.write_lock:
+                store = await compute_pool.run(open_store)
+                async with store_writes(store):
+                    await compute_pool.run(store.merge_staged, staging)
+                    processor = DataProcessor.from_store(store, data_path=file_path)
+                    await publish_dataset(processor)
+        finally:
+            await compute_pool.run(staging.discard)
+
+        return {"message": "File uploaded and validated successfully", "file_path": file_path,
+                "total_rows": processor.memory_usage()["rows"]}
+
+    async def ingest():
+        # Parse and validate the file in a single chunked pass
+        df = await ingest_pool.run(ingest_file, file_path, cache=data_cache, digest=digest,
+                                  compact=COMPACT_STORAGE)
         
-        # Validate the data
-        df = pd.read_excel(file_path)
-        is_valid, validation_results = DataValidator.validate_data(df)
+        # Build the new dataset in the background, then publish it atomically
+        processor = await compute_pool.run(DataProcessor.from_frame, df, data_path=file_path,
+                                           cache=data_cache, compact=COMPACT_STORAGE)
+        async with datasets.write_lock:
+            await publish_dataset(processor)
         
-        if not is_valid:
-            error_message = DataValidator.get_validation_message(validation_results)
-            raise HTTPException(status_code=400, detail=error_message)
+        return {"message": "File uploaded and validated successfully", "file_path": file_path,
+                "total_rows": len(processor.df)}
+
+    job = jobs.submit("upload", ingest_into_store if USE_STORE else ingest)
+    return job_response(job, "File received; ingestion started", file_path)
+
+@app.post("/api/append", status_code=202)
+async def append_file(file: UploadFile = File(...), replace_existing: bool = False):
+    """
+    Merge an Excel workbook or CSV file into the dataset.
+    Responds 202 with a job to poll at status_url; validation errors are
+    reported by that job as failed. Responds 400 straight away for an
+    unsupported file type or an empty file.
+    """
+    file_path, digest = await receive_checked_upload(file)
+
+    async def append_into_store():
+        staging = await compute_pool.run(staging_store)
+        try:
+            await compute_pool.run(ingest_to_store, file_path, staging, compact=COMPACT_STORAGE)
+            # Deduplicate against the latest dataset under the lock, keeping the last row of each key
+            async with datasets.write_lock:
+                current = datasets.current()
+                store = current.store.copy() if current is not None else await compute_pool.run(open_store)
+                async with store_writes(store):
+                    summary = await compute_pool.run(store.merge_staged, staging, append=True,
+                                                     replace_existing=replace_existing)
+                    processor = DataProcessor.from_store(store, data_path=file_path)
+                    await publish_dataset(processor)
+        finally:
+            await compute_pool.run(staging.discard)
+
+        return {"message": "File appended successfully", "file_path": file_path, **summary,
+                "total_rows": processor.memory_usage()["rows"]}
+
+    async def append():
+        df = await ingest_pool.run(ingest_file, file_path, cache=data_cache, digest=digest,
+                                  compact=COMPACT_STORAGE)
         
-        # Initialize data processor with the uploaded file
-        global data_processor
-        data_processor = DataProcessor(file_path)
+        # Merge only the new rows into a copy of the latest dataset and publish it
+        async with datasets.write_lock:
+            current = datasets.current()
+            processor = (current.copy() if current is not None
+                         else DataProcessor(cache=data_cache, compact=COMPACT_STORAGE))
+            summary = await compute_pool.run(processor.append_data, df, replace_existing=replace_existing)
+            await publish_dataset(processor)
         
-        return {"message": "File uploaded and validated successfully", "file_path": file_path}
+        return {"message": "File appended successfully", "file_path": file_path, **summary}
+
+    job = jobs.submit("append", append_into_store if USE_STORE else append)
+    return job_response(job, "File received; append started", file_path)
+
+@app.post("/api/bulk-import", status_code=202)
+async def bulk_import(files: List[UploadFile] = File(...), append: bool = False, replace_existing: bool = False):
+    """
+    Import many workbooks (every sheet of each) or CSV files as one dataset.
+    Parts are parsed and validated independently in parallel; parts that fail
+    are reported without aborting the rest of the batch. Files that are not
+    workbooks or CSV files, by extension or by contents, fail as their own part.
+    """
+    received = []
+    try:
+        for file in files:
+            try:
+                check_file_type(file.filename or "")
+            except ValueError as e:
+                received.append((file.filename, None, str(e)))
+                continue
+            file_path, _ = await receive_upload(file)
+            received.append((file.filename, file_path, None))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def run():
+        report, tasks = [], []
+        for name, file_path, error in received:
+            if error is not None:
+                report.append({"file": name, "sheet": None, "status": "failed", "rows": 0, "error": error})
+                continue
+            try:
+                await ingest_pool.run(check_file_contents, file_path, name)
+                sheets = await ingest_pool.run(list_sheets, file_path)
+            except Exception as e:
+                report.append({"file": name, "sheet": None, "status": "failed", "rows": 0, "error": str(e)})
+                continue
+            for sheet in sheets:
+                report.append({"file": name, "sheet": sheet, "status": "queued", "rows": 0, "error": None})
+                tasks.append((report[-1], bulk_pool.run(ingest_file, file_path, sheet=sheet, compact=COMPACT_STORAGE)))
+
+        results = await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        frames = []
+        for (part, _), result in zip(tasks, results):
+            if isinstance(result, Exception):
+                part.update(status="failed", error=str(result) if isinstance(result, (IngestionError, ValueError))
+                            else f"{type(result).__name__}: {result}")
+            else:
+                part.update(status="imported", rows=len(result))
+                frames.append(result)
+
+        summary = {"parts": report, "parts_failed": sum(part["status"] == "failed" for part in report)}
+        if not frames:
+            return {"message": "No files were imported", **summary}
+
+        df = await compute_pool.run(DataProcessor.concat_frames, *frames)
+        async with datasets.write_lock:
+            current = datasets.current()
+            if USE_STORE:
+                store = current.store.copy() if append and current is not None \
+                    else await compute_pool.run(new_store)
+                async with store_writes(store):
+                    counts = await compute_pool.run(store.append, df, replace_existing=replace_existing) if append \
+                        else {"rows_added": await compute_pool.run(store.add, df)}
+                    processor = DataProcessor.from_store(store)
+                    await publish_dataset(processor)
+            else:
+                if append and current is not None:
+                    processor = current.copy()
+                    counts = await compute_pool.run(processor.append_data, df, replace_existing=replace_existing)
+                else:
+                    processor = await compute_pool.run(DataProcessor.from_frame, df, cache=data_cache,
+                                                       compact=COMPACT_STORAGE)
+                    counts = {"rows_added": len(df)}
+                await publish_dataset(processor)
+
+        total_rows = processor.memory_usage()["rows"]
+        return {"message": "Bulk import finished", **summary, **counts, "total_rows": total_rows}
+
+    job = jobs.submit("bulk-import", run)
+    return {
+        "message": f"{len(received)} files received; bulk import started",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['job_id']}"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
 @app.post("/api/query")
 async def process_query(query: Query):
     try:
-        if data_processor is None:
-            raise HTTPException(status_code=400, detail="Please upload data file first")
-        
-        # Process natural language query
-        extracted_params = query_processor.process_query(query.message)
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            # Process natural language query
+            normalized_message = " ".join(query.message.lower().split())
+            extracted_params = parse_cache.get_or_compute(
+                (processor.version, normalized_message),
+                lambda: query_processor.process_query(normalized_message)
+            )
+            
+            # Use extracted parameters or provided ones
+            device_id = extracted_params['device_id'] or query.device_id or None
+            location = extracted_params['location'] or query.location or None
+            month = extracted_params['month'] or query.month or None
+            
+            # Calculate OEE, off the event loop unless the result is cached
+            # The reply below is generated from the numbers, so calculate_oee formats no message
+            oee_key = (processor.version, device_id, location, month)
+            oee_data = oee_cache.get(oee_key)
+            if oee_data is MISSING:
+                oee_data = await compute_pool.run(
+                    processor.calculate_oee, device_id=device_id, location=location, month=month,
+                    include_message=False)
+                oee_cache.put(oee_key, oee_data)
         
-        # Use extracted parameters or provided ones
-        device_id = extracted_params['device_id'] or query.device_id
-        location = extracted_params['location'] or query.location
-        month = extracted_params['month'] or query.month
-        
-        # Calculate OEE
-        oee_data = data_processor.calculate_oee(
-            device_id=device_id,
-            location=location,
-            month=month
-        )
+        if not query.include_message:
+            return oee_data
         
         # Generate natural language response
-        response_message = query_processor.generate_response(query.message, oee_data)
+        with span("respond"):
+            response_message = query_processor.generate_response(query.message, oee_data)
         
         return {
             **oee_data,
@@ -89,16 +559,239 @@ async def process_query(query: Query):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/batch")
+async def process_batch_query(query: BatchQuery):
+    try:
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            # Either an explicit list of filter combinations or a group-by request
+            if query.group_by:
+                results = await compute_pool.run(
+                    processor.calculate_oee_grouped,
+                    query.group_by,
+                    device_id=query.device_id,
+                    location=query.location,
+                    month=query.month
+                )
+            else:
+                results = await compute_pool.run(processor.calculate_oee_batch, [
+                    {"device_id": f.device_id, "location": f.location, "month": f.month}
+                    for f in query.filters
+                ])
+        
+        return {"results": results}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/trend")
+async def get_trend(device_id: Optional[str] = None, location: Optional[str] = None,
+                    windows: Optional[str] = None, yoy: bool = False):
+    try:
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            # windows is a comma-separated list of rolling window sizes in months, e.g. "3,6,12"
+            window_sizes = [int(w) for w in windows.split(",") if w.strip()] if windows else []
+            trend = await compute_pool.run(
+                processor.calculate_trend,
+                device_id=device_id,
+                location=location,
+                windows=window_sizes,
+                year_over_year=yoy
+            )
+        
+        return {"device_id": device_id, "location": location, "trend": trend}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/rankings")
+async def get_rankings(location: Optional[str] = None, month: Optional[str] = None,
+                       top_n: int = 5, metric: str = "oee"):
+    try:
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            return await compute_pool.run(
+                processor.rank_devices, location=location, month=month, top_n=top_n, metric=metric)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes what its body needs held open once the
+    response is over, whether the body was sent in full, cut short by a
+    disconnect or never started. Background tasks are skipped on a
+    disconnect, so this runs in a finally instead.
+    """
+
+    def __init__(self, content: Iterator[bytes], release: ExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release.close()
+
+@app.get("/api/export")
+async def export_oee(request: Request, group_by: str = "device_id,location,month",
+                     device_id: Optional[str] = None, location: Optional[str] = None,
+                     month: Optional[str] = None, format: str = "csv", gzip: Optional[bool] = None):
+    """
+    OEE and its components for every group_by combination (comma-separated),
+    streamed as CSV, NDJSON or Arrow IPC in batches. Compressed with gzip when
+    the client accepts it, unless gzip=false.
+    """
+    try:
+        check_format(format)
+        dims = [dim.strip() for dim in group_by.split(",") if dim.strip()]
+        media_type, extension = EXPORT_FORMATS[format]
+        headers = {"Content-Disposition": f'attachment; filename="oee_export.{extension}"'}
+        if gzip is None:
+            # Negotiated, so caches must key the response on the request's Accept-Encoding
+            gzip = "gzip" in request.headers.get("accept-encoding", "")
+            headers["Vary"] = "Accept-Encoding"
+        
+        with ExitStack() as stack:
+            processor = stack.enter_context(datasets.snapshot())
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            # Groups are read and serialized batch by batch while the response streams,
+            # so the snapshot stays pinned until the last batch is sent
+            frames = processor.oee_frames(dims, device_id=device_id, location=location, month=month)
+            chunks = iter_export(frames, format)
+            # Closing the encoder first ends any read still open on the snapshot
+            stack.callback(chunks.close)
+            release = stack.pop_all()
+        
+        if gzip:
+            chunks = gzip_stream(chunks)
+            headers["Content-Encoding"] = "gzip"
+        return ReleasingStreamingResponse(chunks, release, media_type=media_type, headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/losses")
+async def get_losses(device_id: Optional[str] = None, location: Optional[str] = None,
+                     month: Optional[str] = None, top_n: int = 10, method: str = "zscore",
+                     threshold: Optional[float] = None, include_cells: bool = True):
+    """
+    Lost hours per loss category with Pareto rankings of devices and
+    locations, outlier months flagged by z-score or IQR (method=iqr), and the
+    losses of every device, location and month (skipped with include_cells=false)
+    """
+    try:
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            return await compute_pool.run(
+                processor.analyze_losses, device_id=device_id, location=location, month=month,
+                top_n=top_n, method=method, threshold=threshold, include_cells=include_cells)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/"x" matches "x"; * matches anything"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
 @app.get("/api/filters")
-async def get_filters():
+async def get_filters(request: Request, response: Response, field: Optional[str] = None,
+                      prefix: str = "", offset: int = 0, limit: Optional[int] = None):
+    """
+    All filter lists, or one field's values paged and narrowed by a
+    case-insensitive prefix (e.g. ?field=device_ids&prefix=dev&limit=50).
+    Unchanged lists are answered with 304 Not Modified via ETag.
+    """
     try:
-        if data_processor is None:
-            raise HTTPException(status_code=400, detail="Please upload data file first")
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            # Built once per dataset version on the pool, then served straight from memory
+            index = processor.cached_filter_index()
+            if index is None:
+                index = await compute_pool.run(processor.filter_index)
+        
+        etag = index.etag(field=field, prefix=prefix, offset=offset, limit=limit)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
         
-        return data_processor.get_available_filters()
+        if field is None:
+            return index.as_dict()
+        return index.search(field, prefix=prefix, offset=offset, limit=limit)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/facets")
+async def get_facets(device_id: Optional[str] = None, location: Optional[str] = None,
+                     month: Optional[str] = None):
+    """Locations, months and devices that have data given the other chosen filters"""
+    try:
+        with datasets.snapshot() as processor:
+            if processor is None:
+                raise HTTPException(status_code=400, detail="Please upload data file first")
+            
+            index = await compute_pool.run(processor.facet_index)
+        return index.facets(device_id=device_id, location=location, month=month)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {"query_parse": parse_cache.stats(), "oee": oee_cache.stats()}
+
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    processor = datasets.current()
+    return {
+        "status": "healthy",
+        "dataset": datasets.stats(),
+        "memory": processor.memory_usage() if processor is not None else None
+    }
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    report = profiles.get(profile_id)
+    if report is MISSING:
+        raise HTTPException(status_code=404, detail="Unknown or expired profile")
+    return report
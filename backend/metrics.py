@@ -0,0 +1,184 @@
+import bisect
+import contextvars
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans recorded while handling the current request, as (name, seconds) pairs
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_spans", default=None)
+# Profilers collected for the current request when profiling was requested
+_request_profiles: contextvars.ContextVar[Optional[List[cProfile.Profile]]] = \
+    contextvars.ContextVar("request_profiles", default=None)
+# Only one request is profiled at a time; the event-loop profiler is per thread
+_profiling_lock = threading.Lock()
+
+
+class Histogram:
+    """Thread-safe Prometheus-style histogram with a fixed set of label names"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if position < len(self.buckets):
+                series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = [f'{name}="{value}"' for name, value in zip(self.label_names, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            bucket_labels = ",".join(labels + ['le="+Inf"'])
+            lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collects histograms plus callbacks that report gauges or counters at scrape time"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, documentation, label_names)
+            return self._histograms[name]
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """Register a callable returning exposition lines, evaluated on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for histogram in list(self._histograms.values()):
+            lines.extend(histogram.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    "oee_span_duration_seconds", "Duration of instrumented hot-path spans", ["span"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "oee_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block into the span histogram and the current request's span list"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span()"""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_spans() -> List[Tuple[str, float]]:
+    """Begin collecting spans for the current request context"""
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Format spans as a Server-Timing header value, summing repeated span names"""
+    totals: Dict[str, float] = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+
+@contextmanager
+def profile_request() -> Iterator[Optional[List[cProfile.Profile]]]:
+    """
+    Profile the calling thread, plus any work run through profiled() from this
+    context, until the block exits. Yields the collected profilers, or None
+    when another request is already being profiled.
+    Meant for debugging a single request: the calling thread is the event
+    loop, so coroutines of other requests that run meanwhile are recorded too.
+    """
+    if not _profiling_lock.acquire(blocking=False):
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiles = [profiler]
+    token = _request_profiles.set(profiles)
+    profiler.enable()
+    try:
+        yield profiles
+    finally:
+        profiler.disable()
+        _request_profiles.reset(token)
+        _profiling_lock.release()
+
+
+def profiled(call: Callable):
+    """Run call(), under its own profiler if the current request is being profiled"""
+    profiles = _request_profiles.get()
+    if profiles is None:
+        return call()
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(call)
+    finally:
+        profiles.append(profiler)
+
+
+def profile_report(profiles: List[cProfile.Profile], limit: int = 40) -> str:
+    """Merge profilers into a pstats listing sorted by cumulative time"""
+    stream = io.StringIO()
+    stats = pstats.Stats(*profiles, stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,285 @@
+import itertools
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ('device_id', 'location', 'month')
+
+MEASURES = (
+    'planned_production_time',
+    'operating_time',
+    'total_count',
+    'good_count',
+    'ideal_cycle_time_sum',
+    'ideal_cycle_time_count',
+    'row_count'
+)
+
+# Groups per frame from iter_grouped, which bounds the measure rows a bulk export
+# holds at once (PartitionedStore still combines every group before batching)
+GROUP_BATCH_ROWS = 10000
+
+
+def compute_components(totals: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized OEE formulas over an (n, len(MEASURES)) array of totals.
+    Mirrors DataProcessor.calculate_oee: components are clipped to [0, 1],
+    then returned as percentages rounded to two decimals.
+    """
+    totals = np.atleast_2d(totals)
+    ppt, ot, tc, gc, ict_sum, ict_count, _ = totals.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ideal_cycle_time = np.where(ict_count > 0, ict_sum / ict_count, np.nan)
+        availability = np.where(ppt > 0, ot / ppt, 0.0)
+        performance = np.where(ot > 0, (tc * ideal_cycle_time / 60) / ot, 0.0)
+        quality = np.where(tc > 0, gc / tc, 0.0)
+
+    availability = np.clip(availability, 0, 1)
+    performance = np.clip(performance, 0, 1)
+    quality = np.clip(quality, 0, 1)
+    oee = availability * performance * quality
+
+    return {
+        "oee": np.round(oee * 100, 2),
+        "availability": np.round(availability * 100, 2),
+        "performance": np.round(performance * 100, 2),
+        "quality": np.round(quality * 100, 2)
+    }
+
+
+def compute_losses(totals: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Vectorized OEE loss waterfall over an (n, len(MEASURES)) array of totals,
+    in hours of planned production time. With the same clipped components as
+    compute_components, planned time splits into availability loss
+    (ppt × (1 − A)), performance loss (ppt × A × (1 − P)), quality loss
+    (ppt × A × P × (1 − Q)) and the remaining fully productive time.
+    """
+    totals = np.atleast_2d(totals)
+    ppt, ot, tc, gc, ict_sum, ict_count, _ = totals.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ideal_cycle_time = np.where(ict_count > 0, ict_sum / ict_count, np.nan)
+        availability = np.clip(np.where(ppt > 0, ot / ppt, 0.0), 0, 1)
+        performance = np.clip(np.where(ot > 0, (tc * ideal_cycle_time / 60) / ot, 0.0), 0, 1)
+        quality = np.clip(np.where(tc > 0, gc / tc, 0.0), 0, 1)
+
+    # Without an ideal cycle time no time can be attributed to speed losses
+    performance = np.where(np.isnan(performance), 1.0, performance)
+    available = ppt * availability
+    performing = available * performance
+    return {
+        "availability_loss": ppt - available,
+        "performance_loss": available - performing,
+        "quality_loss": performing - performing * quality
+    }
+
+
+class OEECube:
+    """
+    Pre-aggregated OEE totals for every (device_id, location, month) cell
+    and all of its rollups.
+
+    Each rollup level (e.g. device only, device + month, grand total) keeps a
+    hashed index over its keys and a dense array of measure sums, so any
+    filter combination is answered with a single index lookup instead of a
+    scan over the raw rows.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._levels: Dict[Tuple[str, ...], Tuple[Optional[pd.Index], np.ndarray]] = {}
+        self._build_levels(self._aggregate_cells(df))
+
+    @property
+    def cells(self) -> pd.DataFrame:
+        """Measure sums per (device_id, location, month) cell"""
+        index, values = self._levels[DIMENSIONS]
+        return pd.DataFrame(values, index=index, columns=list(MEASURES))
+
+    def keys(self) -> pd.DataFrame:
+        """(device_id, location, month) of every cell that holds rows"""
+        index, values = self._levels[DIMENSIONS]
+        return index[values[:, MEASURES.index('row_count')] > 0].to_frame(index=False)
+
+    @staticmethod
+    def _aggregate_cells(df: pd.DataFrame) -> pd.DataFrame:
+        """Collapse the raw rows into one row of measure sums per cell"""
+        # Accumulate in float64 even when the frame stores compact dtypes
+        frame = pd.DataFrame({
+            'planned_production_time': df['planned_production_time'].astype('float64'),
+            'operating_time': df['operating_time'].astype('float64'),
+            'total_count': df['total_count'].astype('float64'),
+            'good_count': df['good_count'].astype('float64'),
+            'ideal_cycle_time_sum': df['ideal_cycle_time'].astype('float64'),
+            'ideal_cycle_time_count': df['ideal_cycle_time'].notna(),
+            'row_count': 1
+        }, index=df.index)
+        frame[list(DIMENSIONS)] = df[list(DIMENSIONS)]
+
+        cells = frame.groupby(list(DIMENSIONS), sort=False, dropna=False, observed=True)[list(MEASURES)].sum()
+        return cells.astype('float64')
+
+    @staticmethod
+    def _rollup(cells: pd.DataFrame, level: Tuple[str, ...]) -> pd.DataFrame:
+        if not level:
+            return cells.sum().to_frame().T
+        return cells.groupby(level=list(level), sort=False, dropna=False, observed=True).sum()
+
+    def _build_levels(self, cells: pd.DataFrame):
+        """Roll the cells up to every subset of the dimensions"""
+        for size in range(len(DIMENSIONS) + 1):
+            for level in itertools.combinations(DIMENSIONS, size):
+                grouped = self._rollup(cells, level)
+                self._levels[level] = (grouped.index if level else None, grouped.to_numpy())
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the level indexes and arrays"""
+        return int(sum(values.nbytes + (index.memory_usage(deep=True) if index is not None else 0)
+                       for index, values in self._levels.values()))
+
+    def copy(self) -> 'OEECube':
+        """
+        Copy that can be merged into without affecting this cube.
+        merge never modifies arrays in place, so the level arrays are shared.
+        """
+        clone = OEECube.__new__(OEECube)
+        clone._levels = dict(self._levels)
+        return clone
+
+    def merge(self, df: pd.DataFrame, sign: int = 1):
+        """
+        Incrementally add (sign=1) or remove (sign=-1) raw rows.
+        Only the keys touched by the rows are updated; new keys are appended
+        to each level instead of re-aggregating the existing cells.
+        """
+        if df.empty:
+            return
+        delta_cells = self._aggregate_cells(df) * sign
+
+        for level, (index, values) in self._levels.items():
+            delta = self._rollup(delta_cells, level)
+            if index is None:
+                self._levels[level] = (None, values + delta.to_numpy())
+                continue
+
+            positions = index.get_indexer(delta.index)
+            known = positions >= 0
+            values = values.copy()
+            values[positions[known]] += delta.to_numpy()[known]
+            if not known.all():
+                index = index.append(delta.index[~known])
+                values = np.vstack([values, delta.to_numpy()[~known]])
+            self._levels[level] = (index, values)
+
+    def totals(self, device_id: Optional[str] = None,
+               location: Optional[str] = None,
+               month: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Look up the measure sums for a filter combination.
+        Returns None when no rows match the filters.
+        """
+        filters = {'device_id': device_id, 'location': location, 'month': month}
+        level = tuple(dim for dim in DIMENSIONS if filters[dim])
+        index, values = self._levels[level]
+
+        if index is None:
+            position = 0
+        else:
+            key = tuple(filters[dim] for dim in level)
+            try:
+                position = index.get_loc(key if len(key) > 1 else key[0])
+            except (KeyError, TypeError):
+                return None
+
+        row = values[position]
+        if row[MEASURES.index('row_count')] == 0:
+            return None
+        return dict(zip(MEASURES, row))
+
+    def totals_many(self, filters: List[Dict[str, Optional[str]]]) -> np.ndarray:
+        """
+        Look up totals for many filter combinations at once.
+        Filters are grouped by rollup level and resolved with one vectorized
+        index lookup per level. Rows for unmatched filters are all zeros.
+        """
+        result = np.zeros((len(filters), len(MEASURES)))
+        by_level: Dict[Tuple[str, ...], List[int]] = {}
+        for i, f in enumerate(filters):
+            level = tuple(dim for dim in DIMENSIONS if f.get(dim))
+            by_level.setdefault(level, []).append(i)
+
+        for level, rows in by_level.items():
+            index, values = self._levels[level]
+            if index is None:
+                result[rows] = values[0]
+                continue
+            keys = [tuple(filters[i][dim] for dim in level) for i in rows]
+            lookup = pd.MultiIndex.from_tuples(keys, names=list(level)) if len(level) > 1 else pd.Index([k[0] for k in keys])
+            positions = index.get_indexer(lookup)
+            found = positions >= 0
+            result[np.asarray(rows)[found]] = values[positions[found]]
+        return result
+
+    def grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+        """
+        Totals for every combination of the group_by dimensions, restricted
+        to cells matching the fixed filters, from one groupby over the cells.
+        """
+        level_dims = tuple(dim for dim in DIMENSIONS if dim in group_by or (filters or {}).get(dim))
+        index, values = self._levels[level_dims]
+        frame = pd.DataFrame(values, index=index, columns=list(MEASURES)) if index is not None \
+            else pd.DataFrame(values, columns=list(MEASURES))
+
+        for dim, value in (filters or {}).items():
+            if value:
+                frame = frame[frame.index.get_level_values(dim) == value]
+        frame = frame[frame['row_count'] > 0]
+
+        if not group_by:
+            return frame.sum().to_frame().T
+        return frame.groupby(level=list(group_by), sort=True, observed=True).sum()
+
+    def iter_grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None,
+                     batch_rows: int = GROUP_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        grouped() in frames of at most batch_rows groups; always yields at
+        least one frame. Each fixed filter pins its dimension to one value, so
+        the matching cells of the level are already one per group: only their
+        sort order is computed up front, and measure rows are copied from the
+        level arrays one batch at a time.
+        """
+        if not group_by:
+            yield self.grouped(group_by, filters)
+            return
+        level_dims = tuple(dim for dim in DIMENSIONS if dim in group_by or (filters or {}).get(dim))
+        index, values = self._levels[level_dims]
+
+        keep = values[:, MEASURES.index('row_count')] > 0
+        for dim, value in (filters or {}).items():
+            if value:
+                keep &= np.asarray(index.get_level_values(dim) == value)
+        # groupby drops groups with a missing key
+        for dim in group_by:
+            keep &= np.asarray(index.get_level_values(dim).notna())
+        positions = np.flatnonzero(keep)
+        if not len(positions):
+            yield self.grouped(group_by, filters)
+            return
+
+        pinned = [dim for dim in level_dims if dim not in group_by]
+        positions = positions[self._group_keys(index[positions], pinned, group_by).argsort(kind='stable')]
+        for start in range(0, len(positions), batch_rows):
+            batch = positions[start:start + batch_rows]
+            yield pd.DataFrame(values[batch], index=self._group_keys(index[batch], pinned, group_by),
+                               columns=list(MEASURES))
+
+    @staticmethod
+    def _group_keys(index: pd.Index, pinned: List[str], group_by: List[str]) -> pd.Index:
+        """Level keys without the pinned dimensions, in group_by order"""
+        if pinned:
+            index = index.droplevel(pinned)
+        if len(group_by) > 1:
+            index = index.reorder_levels(group_by)
+        return index
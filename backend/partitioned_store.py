@@ -0,0 +1,468 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    feather = None
+
+from oee_cube import DIMENSIONS, GROUP_BATCH_ROWS, MEASURES, OEECube
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+PART_SUFFIX = '.arrow'
+# Uploads are parsed into private stores under this directory before being merged
+STAGING_DIR = '_staging'
+DEFAULT_CACHE_BYTES = 64 * 2 ** 20
+# Partial group-by results are folded together once this many accumulate
+COMBINE_EVERY = 64
+# Device ids of every partition, written next to the manifest on each commit
+DEVICES_PREFIX = 'devices-'
+
+PartitionKey = Tuple[str, str]
+NO_DEVICES = np.array([], dtype=str)
+
+
+def _device_array(values) -> np.ndarray:
+    """Sorted unique device ids as one fixed-width string array instead of a set of objects"""
+    return np.unique(np.asarray(values, dtype=str))
+
+
+def _has_device(device_ids: np.ndarray, device_id: str) -> bool:
+    position = np.searchsorted(device_ids, device_id)
+    return bool(position < len(device_ids) and device_ids[position] == device_id)
+
+
+class PartitionedStore:
+    """
+    OEE rows stored on disk as Arrow IPC files partitioned by (month, location).
+
+    A JSON manifest lists every partition's files and row count, and an Arrow
+    file it references holds every partition's device ids, so queries prune partitions from the filter values without reading any
+    data and then aggregate the remaining partitions one at a time. Only
+    per-partition device totals are held in memory, in an LRU bounded by
+    cache_bytes, so memory stays flat however long the history grows.
+
+    Data files are never modified: appends add files and replacements write
+    new ones. A store's manifest only becomes visible on disk when commit()
+    is called, so a copy can be extended while the original keeps serving
+    reads. Files left behind by superseded manifests are removed by vacuum().
+    Uploads are parsed into a staging store first (see staging() and
+    merge_staged()), so a writer only needs exclusive access for the merge.
+
+    Answers the same aggregate queries as OEECube (totals, totals_many and
+    grouped), so DataProcessor can use either.
+    """
+
+    def __init__(self, root: str, cache_bytes: int = DEFAULT_CACHE_BYTES):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for partitioned storage")
+        self.root = root
+        self._partitions: Dict[PartitionKey, Dict] = {}
+        self._devices_file: Optional[str] = None
+        self._cells = _CellCache(cache_bytes)
+
+    @classmethod
+    def open(cls, root: str, cache_bytes: int = DEFAULT_CACHE_BYTES) -> 'PartitionedStore':
+        """Open the store committed at root, or an empty one if nothing was committed"""
+        store = cls(root, cache_bytes=cache_bytes)
+        try:
+            with open(os.path.join(root, MANIFEST_FILE), 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return store
+        device_ids = store._read_devices(manifest)
+        for part, devices in zip(manifest['partitions'], device_ids):
+            store._partitions[(part['month'], part['location'])] = {
+                'files': list(part['files']),
+                'rows': part['rows'],
+                'device_ids': devices
+            }
+        return store
+
+    def _read_devices(self, manifest: Dict) -> List[np.ndarray]:
+        """Each manifest partition's device ids, from the devices file or listed in older manifests"""
+        if 'devices' not in manifest:
+            return [_device_array(part.get('device_ids', [])) for part in manifest['partitions']]
+        self._devices_file = manifest['devices']
+        table = feather.read_table(os.path.join(self.root, self._devices_file))
+        partitions = table.column('partition').to_numpy()
+        device_ids = np.asarray(table.column('device_id').to_numpy(zero_copy_only=False), dtype=str)
+        # Rows are written sorted by partition, then device id
+        bounds = np.searchsorted(partitions, np.arange(len(manifest['partitions']) + 1))
+        return [device_ids[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    @classmethod
+    def staging(cls, root: str) -> 'PartitionedStore':
+        """An empty private store under root's staging directory, for merge_staged()"""
+        return cls(os.path.join(root, STAGING_DIR, uuid.uuid4().hex))
+
+    def discard(self):
+        """Delete a staging store's files"""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def copy(self) -> 'PartitionedStore':
+        """
+        Copy whose manifest can change without affecting this store; the cell
+        cache is shared, and so are the device id arrays, which are replaced
+        rather than modified in place.
+        """
+        clone = PartitionedStore.__new__(PartitionedStore)
+        clone.root = self.root
+        clone._cells = self._cells
+        clone._devices_file = self._devices_file
+        clone._partitions = {
+            key: {'files': list(part['files']), 'rows': part['rows'], 'device_ids': part['device_ids']}
+            for key, part in self._partitions.items()
+        }
+        return clone
+
+    def commit(self):
+        """Atomically write this store's manifest, making it the one opened from disk"""
+        os.makedirs(self.root, exist_ok=True)
+        partitions = sorted(self._partitions.items())
+        self._devices_file = self._write_devices([part['device_ids'] for _, part in partitions])
+        manifest = {'devices': self._devices_file, 'partitions': [
+            {'month': month, 'location': location, 'files': part['files'], 'rows': part['rows']}
+            for (month, location), part in partitions
+        ]}
+        path = os.path.join(self.root, MANIFEST_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        logger.debug("Committed %d partitions to %s", len(self._partitions), self.root)
+
+    def _write_devices(self, device_ids: List[np.ndarray]) -> str:
+        """Write every partition's device ids to one new Arrow file; returns its path under root"""
+        relative = f"{DEVICES_PREFIX}{uuid.uuid4().hex}{PART_SUFFIX}"
+        table = pa.table({
+            'partition': pa.array(np.repeat(np.arange(len(device_ids), dtype=np.int32),
+                                            [len(devices) for devices in device_ids])),
+            'device_id': pa.array(np.concatenate([NO_DEVICES, *device_ids]), type=pa.string())
+        })
+        path = os.path.join(self.root, relative)
+        feather.write_feather(table, f"{path}.tmp", compression='uncompressed')
+        os.replace(f"{path}.tmp", path)
+        return relative
+
+    def begin(self):
+        """Nothing to lock: only this process writes the store, under the registry's write lock"""
+
+    def rollback(self):
+        """
+        Abandon this store's uncommitted changes. Nothing to undo on disk:
+        the files it wrote are unreferenced and removed by the next vacuum.
+        """
+
+    def release(self):
+        """Nothing to release: reads go through the manifest held in memory"""
+
+    def vacuum(self, staging: bool = False) -> int:
+        """
+        Delete data files not referenced by this store's manifest.
+        Only safe while no other store over the same root is in use; stores
+        still being staged are left alone unless staging is set (at startup,
+        when any staging left over is from an interrupted upload).
+        Returns: the number of files removed
+        """
+        referenced = {os.path.normpath(f) for part in self._partitions.values() for f in part['files']}
+        if self._devices_file:
+            referenced.add(os.path.normpath(self._devices_file))
+        removed = 0
+        if staging:
+            shutil.rmtree(os.path.join(self.root, STAGING_DIR), ignore_errors=True)
+        for directory, subdirectories, names in os.walk(self.root):
+            if directory == self.root and STAGING_DIR in subdirectories:
+                subdirectories.remove(STAGING_DIR)
+            for name in names:
+                relative = os.path.normpath(os.path.relpath(os.path.join(directory, name), self.root))
+                if name.endswith(PART_SUFFIX) and relative not in referenced:
+                    os.remove(os.path.join(self.root, relative))
+                    removed += 1
+        return removed
+
+    def _write_part(self, key: PartitionKey, rows: pd.DataFrame) -> str:
+        month, location = key
+        relative = os.path.join(f"month={quote(month, safe='')}", f"location={quote(location, safe='')}",
+                                f"part-{uuid.uuid4().hex}{PART_SUFFIX}")
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        feather.write_feather(rows.reset_index(drop=True), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+        return relative
+
+    def _read_partition(self, key: PartitionKey) -> pd.DataFrame:
+        frames = [feather.read_table(os.path.join(self.root, f), memory_map=True).to_pandas()
+                  for f in self._partitions[key]['files']]
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    @staticmethod
+    def _split(df: pd.DataFrame) -> Iterator[Tuple[PartitionKey, pd.DataFrame]]:
+        for (month, location), rows in df.groupby(['month', 'location'], sort=False, observed=True):
+            yield (str(month), str(location)), rows
+
+    def _add_rows(self, key: PartitionKey, rows: pd.DataFrame):
+        part = self._partitions.setdefault(key, {'files': [], 'rows': 0, 'device_ids': NO_DEVICES})
+        part['files'].append(self._write_part(key, rows))
+        part['rows'] += len(rows)
+        part['device_ids'] = np.union1d(part['device_ids'], _device_array(rows['device_id'].astype(str)))
+
+    def add(self, df: pd.DataFrame) -> int:
+        """Write rows as they are, without deduplication. Returns: rows written"""
+        for key, rows in self._split(df):
+            self._add_rows(key, rows)
+        return len(df)
+
+    def append(self, df: pd.DataFrame, replace_existing: bool = False) -> Dict[str, int]:
+        """
+        Add rows deduplicated on (device_id, location, month), like
+        DataProcessor.append_data. Rows whose key is already stored are
+        skipped, or replace the stored rows when replace_existing is set;
+        only the partitions holding replaced keys are rewritten.
+        """
+        delta = df.drop_duplicates(list(DIMENSIONS), keep='last')
+        counts = {"rows_received": len(df), "rows_added": 0, "rows_replaced": 0,
+                  "rows_skipped": len(df) - len(delta)}
+        for key, rows in self._split(delta):
+            self._append_partition(key, rows, replace_existing, counts)
+        counts["rows_added"] -= counts["rows_replaced"]
+        return counts
+
+    def _existing(self, key: PartitionKey, rows: pd.DataFrame) -> np.ndarray:
+        part = self._partitions.get(key)
+        if not part:
+            return np.zeros(len(rows), bool)
+        return np.isin(rows['device_id'].astype(str).to_numpy(dtype=str), part['device_ids'])
+
+    def _append_partition(self, key: PartitionKey, rows: pd.DataFrame, replace_existing: bool,
+                          counts: Dict[str, int]):
+        """Add one partition's deduplicated rows, skipping or replacing keys already stored"""
+        existing = self._existing(key, rows)
+        if existing.any():
+            if replace_existing:
+                self._drop_devices(key, _device_array(rows['device_id'].astype(str)[existing]))
+                counts["rows_replaced"] += int(existing.sum())
+            else:
+                rows = rows[~existing]
+                counts["rows_skipped"] += int(existing.sum())
+        if not rows.empty:
+            self._add_rows(key, rows)
+            counts["rows_added"] += len(rows)
+
+    def merge_staged(self, staged: 'PartitionedStore', append: bool = False,
+                     replace_existing: bool = False) -> Dict[str, int]:
+        """
+        Bring the rows of a staging store into this store: in place of all
+        stored rows, or with append deduplicated like append(), keeping the
+        last staged row of each key. Staged files are moved rather than
+        rewritten wherever no row has to be dropped, so the merge costs
+        little more than a rename per file.
+        Returns: row counts as from append()
+        """
+        counts = {"rows_received": staged.row_count, "rows_added": 0, "rows_replaced": 0, "rows_skipped": 0}
+        if not append:
+            self._partitions = {}
+        for key in sorted(staged._partitions):
+            if not append:
+                self._adopt(staged, key)
+                counts["rows_added"] += staged._partitions[key]['rows']
+                continue
+            # One partition at a time, so memory stays bounded by the largest partition
+            rows = staged._read_partition(key)
+            delta = rows.drop_duplicates(list(DIMENSIONS), keep='last')
+            counts["rows_skipped"] += len(rows) - len(delta)
+            if len(delta) == len(rows) and not self._existing(key, delta).any():
+                self._adopt(staged, key)
+                counts["rows_added"] += len(delta)
+            else:
+                self._append_partition(key, delta, replace_existing, counts)
+        counts["rows_added"] -= counts["rows_replaced"]
+        return counts
+
+    def _adopt(self, staged: 'PartitionedStore', key: PartitionKey):
+        """Move a staged partition's files into this store's root and reference them"""
+        source = staged._partitions[key]
+        part = self._partitions.setdefault(key, {'files': [], 'rows': 0, 'device_ids': NO_DEVICES})
+        for relative in source['files']:
+            destination = os.path.join(self.root, relative)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(os.path.join(staged.root, relative), destination)
+            part['files'].append(relative)
+        part['rows'] += source['rows']
+        part['device_ids'] = np.union1d(part['device_ids'], source['device_ids'])
+
+    def _drop_devices(self, key: PartitionKey, devices: np.ndarray):
+        """Rewrite a partition without the given devices' rows"""
+        stored = self._read_partition(key)
+        kept = stored[~stored['device_id'].astype(str).isin(devices)]
+        part = self._partitions[key]
+        part['files'] = [self._write_part(key, kept)] if not kept.empty else []
+        part['rows'] = len(kept)
+        part['device_ids'] = np.setdiff1d(part['device_ids'], devices)
+
+    def _prune(self, device_id: Optional[str] = None, location: Optional[str] = None,
+               month: Optional[str] = None) -> List[PartitionKey]:
+        """Partitions that can hold rows matching the filters, decided from the manifest alone"""
+        return [
+            key for key, part in self._partitions.items()
+            if (not month or key[0] == month) and (not location or key[1] == location)
+            and (not device_id or _has_device(part['device_ids'], device_id)) and part['files']
+        ]
+
+    def _device_totals(self, key: PartitionKey) -> pd.DataFrame:
+        """Measure sums per device for one partition, read on demand and kept in the LRU"""
+        cache_key = tuple(self._partitions[key]['files'])
+        cells = self._cells.get(cache_key)
+        if cells is None:
+            df = self._read_partition(key)
+            df['device_id'] = df['device_id'].astype(str)
+            cells = OEECube._aggregate_cells(df).groupby(level='device_id', sort=False).sum()
+            self._cells.put(cache_key, cells)
+        return cells
+
+    def totals(self, device_id: Optional[str] = None,
+               location: Optional[str] = None,
+               month: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Stream-aggregate the measure sums for a filter combination.
+        Returns None when no rows match the filters.
+        """
+        totals = np.zeros(len(MEASURES))
+        for key in self._prune(device_id, location, month):
+            cells = self._device_totals(key)
+            if device_id:
+                if device_id in cells.index:
+                    totals += cells.loc[device_id].to_numpy()
+            else:
+                totals += cells.to_numpy().sum(axis=0)
+
+        if totals[MEASURES.index('row_count')] == 0:
+            return None
+        return dict(zip(MEASURES, totals))
+
+    def totals_many(self, filters: List[Dict[str, Optional[str]]]) -> np.ndarray:
+        """Totals for many filter combinations. Rows for unmatched filters are all zeros."""
+        result = np.zeros((len(filters), len(MEASURES)))
+        for i, f in enumerate(filters):
+            totals = self.totals(device_id=f.get('device_id'), location=f.get('location'), month=f.get('month'))
+            if totals is not None:
+                result[i] = [totals[measure] for measure in MEASURES]
+        return result
+
+    def grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+        """
+        Totals for every combination of the group_by dimensions, restricted to
+        rows matching the fixed filters. Partial results are combined as
+        partitions stream past, so memory is bounded by the number of groups.
+        """
+        filters = filters or {}
+        partials: List[pd.DataFrame] = []
+        for month, location in self._prune(filters.get('device_id'), filters.get('location'), filters.get('month')):
+            cells = self._device_totals((month, location))
+            if filters.get('device_id'):
+                cells = cells[cells.index == filters['device_id']]
+            frame = cells.reset_index()
+            frame['location'] = location
+            frame['month'] = month
+            partials.append(frame.groupby(group_by, sort=False)[list(MEASURES)].sum() if group_by
+                            else frame[list(MEASURES)].sum().to_frame().T)
+            if len(partials) >= COMBINE_EVERY:
+                partials = [self._combine(partials, group_by)]
+
+        if not partials:
+            if not group_by:
+                return pd.DataFrame(np.zeros((1, len(MEASURES))), columns=list(MEASURES))
+            index = (pd.MultiIndex.from_arrays([[]] * len(group_by), names=group_by) if len(group_by) > 1
+                     else pd.Index([], name=group_by[0]))
+            return pd.DataFrame(np.zeros((0, len(MEASURES))), index=index, columns=list(MEASURES))
+
+        combined = self._combine(partials, group_by)
+        return combined[combined['row_count'] > 0] if group_by else combined
+
+    def iter_grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None,
+                     batch_rows: int = GROUP_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        grouped() in frames of at most batch_rows groups; always yields at
+        least one frame. Groups span partitions, so the whole grouped result
+        is combined first and only the frames handed on are bounded.
+        """
+        grouped = self.grouped(group_by, filters)
+        for start in range(0, max(len(grouped), 1), batch_rows):
+            yield grouped.iloc[start:start + batch_rows]
+
+    @staticmethod
+    def _combine(partials: List[pd.DataFrame], group_by: List[str]) -> pd.DataFrame:
+        frame = pd.concat(partials)
+        if not group_by:
+            return frame.sum().to_frame().T
+        return frame.groupby(level=list(group_by), sort=True).sum()
+
+    def available_filters(self) -> Dict[str, List]:
+        """Filter options straight from the manifest"""
+        parts = [(key, part) for key, part in self._partitions.items() if part['files']]
+        return {
+            "device_ids": np.unique(np.concatenate([NO_DEVICES, *(part['device_ids'] for _, part in parts)])).tolist(),
+            "locations": sorted({location for (_, location), _ in parts}),
+            "months": sorted({month for (month, _), _ in parts})
+        }
+
+    def keys(self) -> pd.DataFrame:
+        """(device_id, location, month) of every stored cell, from the manifest alone"""
+        parts = [(key, part['device_ids']) for key, part in self._partitions.items() if part['files']]
+        sizes = [len(devices) for _, devices in parts]
+        return pd.DataFrame({
+            'device_id': np.concatenate([NO_DEVICES, *(devices for _, devices in parts)]),
+            'location': np.repeat(np.array([location for (_, location), _ in parts], dtype=str), sizes),
+            'month': np.repeat(np.array([month for (month, _), _ in parts], dtype=str), sizes)
+        }, columns=list(DIMENSIONS))
+
+    @property
+    def row_count(self) -> int:
+        return sum(part['rows'] for part in self._partitions.values())
+
+    def nbytes(self) -> int:
+        """Memory held by cached partition totals"""
+        return self._cells.nbytes
+
+
+class _CellCache:
+    """Thread-safe LRU of per-partition totals, bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            cells = self._entries.get(key)
+            if cells is not None:
+                self._entries.move_to_end(key)
+            return cells
+
+    def put(self, key: tuple, cells: pd.DataFrame):
+        size = int(cells.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = cells
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= int(evicted.memory_usage(deep=True).sum())
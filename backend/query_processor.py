@@ -1,64 +1,118 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import re
 from datetime import datetime
 
+from metrics import timed
+
+TOKEN_PATTERN = re.compile(r'[a-z]+|\d+')
+YEAR_PATTERN = re.compile(r'(?:19|20)\d{2}')
+
+NUMBER = '#'     # trie edge matching any numeric token
+TERMINAL = None  # trie key holding the (field, value) of a complete entity
+
+# Fallback patterns used when a numbered entity is not in the vocabulary
+DEFAULT_TEMPLATES = [
+    (['pack', NUMBER], 'device_id', 'PACK{:03d}'),
+    (['wrap', NUMBER], 'device_id', 'WRAP{:03d}'),
+    (['seal', NUMBER], 'device_id', 'SEAL{:03d}'),
+    (['device', NUMBER], 'device_id', 'PACK{:03d}'),
+    (['production', 'line', NUMBER], 'location', 'PRODUCTION_LINE_{}')
+]
+
 class QueryProcessor:
-    def __init__(self):
-        self.month_pattern = r'(january|february|march|april|may|june|july|august|september|october|november|december)'
+    def __init__(self, filters: Optional[Dict[str, List]] = None):
         self.month_map = {
             'january': '01', 'february': '02', 'march': '03', 'april': '04',
             'may': '05', 'june': '06', 'july': '07', 'august': '08',
             'september': '09', 'october': '10', 'november': '11', 'december': '12'
         }
+        self.update_vocabulary(filters or {})
 
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        """Split text into lowercase word and number tokens, dropping leading zeros"""
+        return [str(int(token)) if token.isdigit() else token
+                for token in TOKEN_PATTERN.findall(str(text).lower())]
+
+    @staticmethod
+    def _insert(trie: Dict, tokens: List[str], entity: Tuple[str, str]):
+        node = trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(TERMINAL, entity)
+
+    def update_vocabulary(self, filters: Dict[str, List]):
+        """
+        Build the token trie from the available filter values
+        (as returned by DataProcessor.get_available_filters)
+        """
+        trie: Dict = {}
+        for device_id in filters.get('device_ids', []):
+            self._insert(trie, self._tokenize(device_id), ('device_id', device_id))
+        for location in filters.get('locations', []):
+            self._insert(trie, self._tokenize(location), ('location', location))
+        for month in filters.get('months', []):
+            self._insert(trie, self._tokenize(month), ('month', month))
+        for name, number in self.month_map.items():
+            self._insert(trie, [name], ('month_name', number))
+        for tokens, field, template in DEFAULT_TEMPLATES:
+            self._insert(trie, tokens, (field, template))
+        self._trie = trie
+
+    def _match(self, tokens: List[str], start: int) -> Tuple[Optional[Tuple[str, str]], int]:
+        """Find the longest entity starting at tokens[start], preferring exact tokens over numbers"""
+        best, best_end = None, start
+        stack = [(self._trie, start, None)]
+        while stack:
+            node, position, number = stack.pop()
+            if TERMINAL in node and position > best_end:
+                field, value = node[TERMINAL]
+                best = (field, value.format(number) if number is not None else value)
+                best_end = position
+            if position >= len(tokens):
+                continue
+            token = tokens[position]
+            if NUMBER in node and token.isdigit():
+                stack.append((node[NUMBER], position + 1, int(token)))
+            if token in node:
+                stack.append((node[token], position + 1, number))
+        return best, best_end
+
+    @timed("parse")
     def process_query(self, query: str) -> Dict[str, Optional[str]]:
         """
-        Process natural language query and extract parameters
+        Process natural language query and extract parameters in a single
+        scan over its tokens
         Returns: Dictionary with device_id, location, and month
         """
-        query = query.lower()
         result = {
             'device_id': None,
             'location': None,
             'month': None
         }
+        month_number = None
+        year = None
+
+        tokens = self._tokenize(query)
+        position = 0
+        while position < len(tokens):
+            entity, end = self._match(tokens, position)
+            if entity is None:
+                if year is None and YEAR_PATTERN.fullmatch(tokens[position]):
+                    year = tokens[position]
+                position += 1
+                continue
+
+            field, value = entity
+            if field == 'month_name':
+                month_number = month_number or value
+            elif result[field] is None:
+                result[field] = value
+            position = end
 
-        # Extract device ID (now handles Pack001, PACK001, etc.)
-        device_patterns = [
-            r'(?:device\s+)?(?:pack|device)\s*(\d+)',  # matches pack001, device001
-            r'for\s+(?:pack|device)\s*(\d+)',          # matches "for pack001"
-            r'(?:pack|device)(\d+)'                     # matches PACK001 directly
-        ]
-        
-        for pattern in device_patterns:
-            device_match = re.search(pattern, query)
-            if device_match:
-                result['device_id'] = f"PACK{device_match.group(1).zfill(3)}"
-                break
-
-        # Extract location (now handles PRODUCTION_LINE_1, etc.)
-        location_patterns = [
-            r'(?:location\s+)?production[_\s]*line[_\s]*(\d+)',  # matches production line 1
-            r'for\s+production[_\s]*line[_\s]*(\d+)',            # matches "for production line 1"
-            r'in\s+production[_\s]*line[_\s]*(\d+)'              # matches "in production line 1"
-        ]
-        
-        for pattern in location_patterns:
-            location_match = re.search(pattern, query)
-            if location_match:
-                result['location'] = f"PRODUCTION_LINE_{location_match.group(1)}"
-                break
-
-        # Extract month
-        month_match = re.search(self.month_pattern, query)
-        if month_match:
-            month_name = month_match.group(1)
-            result['month'] = self.month_map[month_name]
-
-        # Handle year if present
-        year_match = re.search(r'20\d{2}', query)
-        if year_match and result['month']:
-            result['month'] = f"{result['month']}-{year_match.group(0)}"
+        # A month name is combined with a year into the dataset's YYYY-MM format
+        if result['month'] is None and month_number:
+            result['month'] = f"{year}-{month_number}" if year else month_number
 
         return result
 
@@ -0,0 +1,403 @@
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from oee_cube import DIMENSIONS, GROUP_BATCH_ROWS, MEASURES
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'oee_rows'
+# One row: the commit generation, bumped by every commit, and the number of stored rows
+META_TABLE = 'oee_meta'
+VALUE_COLUMNS = ('planned_production_time', 'operating_time', 'total_count', 'good_count', 'ideal_cycle_time')
+COLUMNS = DIMENSIONS + VALUE_COLUMNS
+
+# Aggregates in MEASURES order; TOTAL() is SQLite's float sum that yields 0.0 rather than NULL
+AGGREGATES = ("TOTAL(planned_production_time), TOTAL(operating_time), TOTAL(total_count), "
+              "TOTAL(good_count), TOTAL(ideal_cycle_time), COUNT(ideal_cycle_time), COUNT(*)")
+
+PRAGMAS = ["PRAGMA auto_vacuum = INCREMENTAL", "PRAGMA journal_mode = WAL"]
+SCHEMA = [
+    f"CREATE TABLE IF NOT EXISTS {TABLE} (device_id TEXT NOT NULL, location TEXT NOT NULL, month TEXT NOT NULL, "
+    "planned_production_time REAL, operating_time REAL, total_count REAL, good_count REAL, ideal_cycle_time REAL)",
+    f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_key ON {TABLE} (device_id, location, month)",
+    f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_location_month ON {TABLE} (location, month)",
+    f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_month ON {TABLE} (month)",
+    f"CREATE TABLE IF NOT EXISTS {META_TABLE} (id INTEGER PRIMARY KEY CHECK (id = 0), "
+    "generation INTEGER NOT NULL, row_count INTEGER NOT NULL)",
+    # Files written before the metadata row existed are counted once, here
+    f"INSERT OR IGNORE INTO {META_TABLE} (id, generation, row_count) SELECT 0, 0, COUNT(*) FROM {TABLE}"
+]
+
+# Connections for reading the latest commit state, per thread and per database file
+_readers = threading.local()
+
+
+class SQLiteStore:
+    """
+    OEE rows kept in an embedded SQLite database file.
+
+    Rows are indexed on (device_id, location, month), so every lookup is an
+    indexed aggregate query and nothing is loaded into memory. The file
+    persists across restarts and is shared by every worker process; WAL mode
+    lets readers keep going while a writer is active.
+
+    Writes from add/append go into a transaction on the store's own
+    connection and only become visible to other stores over the file on
+    commit(), or are discarded by rollback(). Until then the store reads
+    through that connection, so it sees its own pending rows. Uploads are
+    parsed into a separate staging file first (see staging() and
+    merge_staged()), so the write transaction only lasts for the merge.
+
+    Otherwise a store reads through one read transaction opened on its first
+    query, so it answers from the same snapshot however many commits other
+    workers make meanwhile, and results derived from it stay valid for as
+    long as the store is used. Every commit bumps a generation number in the
+    same transaction; comparing committed_state() with generation tells a
+    worker that another one has published newer data. release() ends the
+    snapshot once nothing reads the store any more.
+
+    Answers the same queries as OEECube and PartitionedStore, so
+    DataProcessor can use any of them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer: Optional[sqlite3.Connection] = None
+        self._snapshot: Optional[sqlite3.Connection] = None
+        self._generation: Optional[int] = None
+        # Pool threads share the snapshot connection, one query at a time
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(sqlite3.connect(path, timeout=30, isolation_level=None)) as conn:
+            # The metadata table is created last, so once it exists the schema is complete
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (META_TABLE,)).fetchone():
+                for pragma in PRAGMAS:
+                    conn.execute(pragma)
+                # Workers starting together create the schema one at a time
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.execute("COMMIT")
+
+    @classmethod
+    def empty(cls, path: str) -> 'SQLiteStore':
+        """A store whose commit replaces every stored row with the rows added to it"""
+        store = cls(path)
+        store._write().execute(f"DELETE FROM {TABLE}")
+        store._write().execute(f"UPDATE {META_TABLE} SET row_count = 0")
+        return store
+
+    @staticmethod
+    def committed_state(path: str) -> Tuple[int, int]:
+        """(generation, row_count) as last committed to the file by any worker"""
+        connections = getattr(_readers, 'connections', None)
+        if connections is None:
+            connections = _readers.connections = {}
+        conn = connections.get(path)
+        if conn is None:
+            conn = connections[path] = sqlite3.connect(path, timeout=30)
+        return conn.execute(f"SELECT generation, row_count FROM {META_TABLE}").fetchone()
+
+    @classmethod
+    def staging(cls, path: str) -> 'SQLiteStore':
+        """An empty private store in a file next to path, for merge_staged()"""
+        return cls(f"{path}.staging-{uuid.uuid4().hex}")
+
+    def discard(self):
+        """Delete a staging store's file"""
+        self.rollback()
+        self.release()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def copy(self) -> 'SQLiteStore':
+        """A store over the same file whose writes stay private until committed"""
+        return SQLiteStore(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._writer is not None:
+            return self._writer
+        if self._snapshot is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("BEGIN")
+            # The first read fixes the snapshot that every later read of this store sees
+            self._generation = conn.execute(f"SELECT generation FROM {META_TABLE}").fetchone()[0]
+            self._snapshot = conn
+        return self._snapshot
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    @property
+    def generation(self) -> Optional[int]:
+        """Commit generation of the snapshot this store reads, pinning it if no read has yet"""
+        with self._lock:
+            if self._writer is None:
+                self._connection()
+            return self._generation
+
+    def begin(self):
+        """
+        Start the write transaction now rather than on the first write, so
+        reads until commit() or rollback() see the latest rows, which no other
+        worker can change meanwhile
+        """
+        self.release()
+        self._write()
+
+    def _write(self, attach: Optional[str] = None) -> sqlite3.Connection:
+        if self._writer is None:
+            # Pool threads take turns writing (under the registry's write lock), so share the connection
+            self._writer = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            if attach is not None:
+                # Databases cannot be attached inside a transaction
+                self._writer.execute("ATTACH DATABASE ? AS staged", (attach,))
+            self._writer.execute("BEGIN IMMEDIATE")
+        return self._writer
+
+    def commit(self):
+        """Make this store's pending writes visible to every reader of the file"""
+        if self._writer is not None:
+            self._writer.execute(f"UPDATE {META_TABLE} SET generation = generation + 1")
+            self._generation = self._writer.execute(f"SELECT generation FROM {META_TABLE}").fetchone()[0]
+            self._writer.execute("COMMIT")
+            self._writer.close()
+            self._writer = None
+            # The next read pins a snapshot that includes this commit
+            self.release()
+            logger.debug("Committed SQLite store %s at generation %d", self.path, self._generation)
+
+    def rollback(self):
+        """Discard this store's pending writes"""
+        if self._writer is not None:
+            self._writer.execute("ROLLBACK")
+            self._writer.close()
+            self._writer = None
+
+    def release(self):
+        """End the pinned read snapshot; a later read pins the latest commit again"""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+
+    def vacuum(self, staging: bool = False) -> int:
+        """
+        Return free pages left by deleted rows to the file system. Staging
+        files are never touched, since they may belong to other workers.
+        Returns: always 0 files
+        """
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.commit()
+        return 0
+
+    @staticmethod
+    def _records(df: pd.DataFrame) -> List[tuple]:
+        frame = pd.DataFrame({col: df[col].astype(str) for col in DIMENSIONS})
+        for col in VALUE_COLUMNS:
+            frame[col] = df[col].astype('float64')
+        frame = frame.astype(object).where(frame.notna(), None)
+        return list(frame.itertuples(index=False, name=None))
+
+    def _count_rows(self, delta: int):
+        """Keep the stored row count in step with a write, in the same transaction"""
+        self._write().execute(f"UPDATE {META_TABLE} SET row_count = row_count + ?", (delta,))
+
+    def _insert(self, df: pd.DataFrame):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        self._write().executemany(f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                                  self._records(df))
+        self._count_rows(len(df))
+
+    def add(self, df: pd.DataFrame) -> int:
+        """Write rows as they are, without deduplication. Returns: rows written"""
+        self._insert(df)
+        return len(df)
+
+    def append(self, df: pd.DataFrame, replace_existing: bool = False) -> Dict[str, int]:
+        """
+        Add rows deduplicated on (device_id, location, month), like
+        DataProcessor.append_data. Rows whose key is already stored are
+        skipped, or replace the stored rows when replace_existing is set.
+        """
+        delta = df.drop_duplicates(list(DIMENSIONS), keep='last')
+        keys = list(zip(*(delta[col].astype(str) for col in DIMENSIONS)))
+        conn = self._write()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (device_id TEXT, location TEXT, month TEXT)")
+        conn.execute("DELETE FROM incoming")
+        conn.executemany("INSERT INTO incoming VALUES (?, ?, ?)", keys)
+        stored = set(conn.execute(
+            f"SELECT device_id, location, month FROM incoming "
+            f"INTERSECT SELECT device_id, location, month FROM {TABLE}").fetchall())
+        existing = np.array([key in stored for key in keys], dtype=bool)
+
+        rows_replaced = 0
+        if replace_existing and existing.any():
+            deleted = conn.executemany(f"DELETE FROM {TABLE} WHERE device_id = ? AND location = ? AND month = ?",
+                                       [key for key, found in zip(keys, existing) if found]).rowcount
+            self._count_rows(-deleted)
+            rows_replaced = int(existing.sum())
+        else:
+            delta = delta[~existing]
+
+        self._insert(delta)
+        return {
+            "rows_received": len(df),
+            "rows_added": len(delta) - rows_replaced,
+            "rows_replaced": rows_replaced,
+            "rows_skipped": len(df) - len(delta)
+        }
+
+    def merge_staged(self, staged: 'SQLiteStore', append: bool = False,
+                     replace_existing: bool = False) -> Dict[str, int]:
+        """
+        Bring the rows of a staging store into this store: in place of all
+        stored rows, or with append deduplicated like append(), keeping the
+        last staged row of each key. The staged file is attached and copied
+        with INSERT ... SELECT, so no row passes through Python.
+        Returns: row counts as from append()
+        """
+        staged.commit()
+        conn = self._write(attach=staged.path)
+        columns = ", ".join(COLUMNS)
+        received = conn.execute(f"SELECT COUNT(*) FROM staged.{TABLE}").fetchone()[0]
+        if not append:
+            conn.execute(f"DELETE FROM {TABLE}")
+            conn.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM staged.{TABLE}")
+            conn.execute(f"UPDATE {META_TABLE} SET row_count = ?", (received,))
+            return {"rows_received": received, "rows_added": received, "rows_replaced": 0, "rows_skipped": 0}
+
+        # Staged rows are inserted in file order, so the highest rowid of a key is its last row
+        conn.execute("DROP TABLE IF EXISTS temp.staged_rows")
+        conn.execute(f"CREATE TEMP TABLE staged_rows AS SELECT {columns} FROM staged.{TABLE} WHERE rowid IN "
+                     f"(SELECT MAX(rowid) FROM staged.{TABLE} GROUP BY device_id, location, month)")
+        conn.execute("CREATE INDEX temp.idx_staged_rows_key ON staged_rows (device_id, location, month)")
+        unique = conn.execute("SELECT COUNT(*) FROM staged_rows").fetchone()[0]
+        stored = (f"EXISTS (SELECT 1 FROM {TABLE} WHERE {TABLE}.device_id = s.device_id "
+                  f"AND {TABLE}.location = s.location AND {TABLE}.month = s.month)")
+        existing = conn.execute(f"SELECT COUNT(*) FROM staged_rows s WHERE {stored}").fetchone()[0]
+        if replace_existing:
+            deleted = conn.execute(f"DELETE FROM {TABLE} WHERE EXISTS (SELECT 1 FROM staged_rows s "
+                                   f"WHERE s.device_id = {TABLE}.device_id AND s.location = {TABLE}.location "
+                                   f"AND s.month = {TABLE}.month)").rowcount
+            inserted = conn.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM staged_rows").rowcount
+        else:
+            deleted = 0
+            inserted = conn.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} "
+                                    f"FROM staged_rows s WHERE NOT {stored}").rowcount
+        self._count_rows(inserted - deleted)
+        return {
+            "rows_received": received,
+            "rows_added": unique - existing,
+            "rows_replaced": existing if replace_existing else 0,
+            "rows_skipped": received - unique + (0 if replace_existing else existing)
+        }
+
+    @staticmethod
+    def _where(filters: Dict[str, Optional[str]]):
+        dims = [dim for dim in DIMENSIONS if filters.get(dim)]
+        clause = " AND ".join(f"{dim} = ?" for dim in dims)
+        return (f" WHERE {clause}" if clause else ""), [filters[dim] for dim in dims]
+
+    def totals(self, device_id: Optional[str] = None,
+               location: Optional[str] = None,
+               month: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Indexed aggregate of the measure sums for a filter combination.
+        Returns None when no rows match the filters.
+        """
+        where, params = self._where({'device_id': device_id, 'location': location, 'month': month})
+        row = self._query(f"SELECT {AGGREGATES} FROM {TABLE}{where}", params)[0]
+        if row[-1] == 0:
+            return None
+        return dict(zip(MEASURES, map(float, row)))
+
+    def totals_many(self, filters: List[Dict[str, Optional[str]]]) -> np.ndarray:
+        """Totals for many filter combinations. Rows for unmatched filters are all zeros."""
+        result = np.zeros((len(filters), len(MEASURES)))
+        for i, f in enumerate(filters):
+            totals = self.totals(device_id=f.get('device_id'), location=f.get('location'), month=f.get('month'))
+            if totals is not None:
+                result[i] = [totals[measure] for measure in MEASURES]
+        return result
+
+    def grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+        """Totals for every combination of the group_by dimensions, restricted to the fixed filters"""
+        unknown = [dim for dim in group_by if dim not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group by: {', '.join(unknown)}")
+        where, params = self._where(filters or {})
+        if not group_by:
+            row = self._query(f"SELECT {AGGREGATES} FROM {TABLE}{where}", params)[0]
+            return pd.DataFrame([row], columns=list(MEASURES)).astype('float64')
+
+        columns = ", ".join(group_by)
+        rows = self._query(
+            f"SELECT {columns}, {AGGREGATES} FROM {TABLE}{where} GROUP BY {columns} ORDER BY {columns}", params)
+        frame = pd.DataFrame(rows, columns=list(group_by) + list(MEASURES)).set_index(list(group_by))
+        return frame.astype('float64')
+
+    def iter_grouped(self, group_by: List[str], filters: Optional[Dict[str, Optional[str]]] = None,
+                     batch_rows: int = GROUP_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        grouped() in frames of at most batch_rows groups, fetched from one
+        cursor as the frames are consumed; always yields at least one frame
+        """
+        if not group_by:
+            yield self.grouped(group_by, filters)
+            return
+        unknown = [dim for dim in group_by if dim not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group by: {', '.join(unknown)}")
+        where, params = self._where(filters or {})
+        columns = ", ".join(group_by)
+        with self._lock:
+            cursor = self._connection().execute(
+                f"SELECT {columns}, {AGGREGATES} FROM {TABLE}{where} GROUP BY {columns} ORDER BY {columns}", params)
+        try:
+            first = True
+            while True:
+                # The snapshot connection is shared, so it is only held for one batch at a time
+                with self._lock:
+                    rows = cursor.fetchmany(batch_rows)
+                if rows or first:
+                    frame = pd.DataFrame(rows, columns=list(group_by) + list(MEASURES)).set_index(list(group_by))
+                    yield frame.astype('float64')
+                first = False
+                if len(rows) < batch_rows:
+                    return
+        finally:
+            cursor.close()
+
+    def keys(self) -> pd.DataFrame:
+        """(device_id, location, month) of every stored cell"""
+        rows = self._query(f"SELECT DISTINCT device_id, location, month FROM {TABLE}")
+        return pd.DataFrame(rows, columns=list(DIMENSIONS))
+
+    def available_filters(self) -> Dict[str, List]:
+        return {
+            field: [value for (value,) in self._query(f"SELECT DISTINCT {dim} FROM {TABLE} ORDER BY {dim}")]
+            for dim, field in (('device_id', 'device_ids'), ('location', 'locations'), ('month', 'months'))
+        }
+
+    @property
+    def row_count(self) -> int:
+        """Kept up to date by every write, so it is a single-row read rather than a count"""
+        return self._query(f"SELECT row_count FROM {META_TABLE}")[0][0]
+
+    def nbytes(self) -> int:
+        """Rows live in the database file, not in process memory"""
+        return 0
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules use flat imports and are run from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_sample_data import build_sample_frame  # noqa: E402
+
+
+@pytest.fixture
+def sample_frame():
+    """A small, valid OEE dataset: 6 devices x 3 locations x 4 months"""
+    return build_sample_frame(n_devices=6, n_locations=3, n_months=4, seed=1)
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from oee_cube import DIMENSIONS
+from partitioned_store import PartitionedStore
+from sqlite_store import SQLiteStore
+
+STORES = {
+    "partitioned": lambda tmp_path: PartitionedStore(str(tmp_path / "partitions")),
+    "sqlite": lambda tmp_path: SQLiteStore(str(tmp_path / "oee.sqlite3")),
+}
+STAGING = {
+    "partitioned": lambda tmp_path: PartitionedStore.staging(str(tmp_path / "partitions")),
+    "sqlite": lambda tmp_path: SQLiteStore.staging(str(tmp_path / "oee.sqlite3")),
+}
+
+
+@pytest.fixture
+def frames(sample_frame):
+    """
+    Stored rows for the first three months, then an upload of the last two
+    months with new values in which one key appears twice, first in the
+    first half of the upload and then in the second
+    """
+    months = sorted(sample_frame['month'].unique())
+    base = sample_frame[sample_frame['month'].isin(months[:3])].reset_index(drop=True)
+    incoming = sample_frame[sample_frame['month'].isin(months[2:])].reset_index(drop=True)
+    incoming['good_count'] = (incoming['good_count'] * 0.9).round()
+    repeated = incoming.iloc[[0]].copy()
+    repeated['good_count'] = repeated['good_count'] - 1
+    first, second = incoming.iloc[:len(incoming) // 2], incoming.iloc[len(incoming) // 2:]
+    return base, [first, pd.concat([repeated, second], ignore_index=True)]
+
+
+def cells(cube) -> pd.DataFrame:
+    frame = cube.grouped(list(DIMENSIONS))
+    frame.index = pd.MultiIndex.from_tuples([tuple(map(str, key)) for key in frame.index], names=DIMENSIONS)
+    return frame.sort_index().astype('float64')
+
+
+def reference(base, chunks, replace_existing):
+    processor = DataProcessor.from_frame(DataProcessor.prepare_frame(base.copy()))
+    counts = processor.append_data(pd.concat(chunks, ignore_index=True), replace_existing=replace_existing)
+    counts.pop("total_rows")
+    return counts, cells(processor.cube)
+
+
+@pytest.mark.parametrize("replace_existing", [False, True])
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_store_append_matches_append_data(tmp_path, frames, backend, replace_existing):
+    base, chunks = frames
+    store = STORES[backend](tmp_path)
+    store.add(DataProcessor.prepare_frame(base.copy()))
+    counts = store.append(DataProcessor.prepare_frame(pd.concat(chunks, ignore_index=True)),
+                          replace_existing=replace_existing)
+
+    expected_counts, expected_cells = reference(base, chunks, replace_existing)
+    assert counts == expected_counts
+    pd.testing.assert_frame_equal(cells(store), expected_cells, check_exact=False)
+
+
+@pytest.mark.parametrize("replace_existing", [False, True])
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_staged_append_keeps_last_row_across_chunks(tmp_path, frames, backend, replace_existing):
+    base, chunks = frames
+    store = STORES[backend](tmp_path)
+    store.add(DataProcessor.prepare_frame(base.copy()))
+    store.commit()
+    staged = STAGING[backend](tmp_path)
+    for chunk in chunks:
+        staged.add(DataProcessor.prepare_frame(chunk.copy()))
+    counts = store.merge_staged(staged, append=True, replace_existing=replace_existing)
+    staged.discard()
+
+    expected_counts, expected_cells = reference(base, chunks, replace_existing)
+    assert counts == expected_counts
+    pd.testing.assert_frame_equal(cells(store), expected_cells, check_exact=False)
+
+
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_staged_replace_swaps_in_staged_rows(tmp_path, frames, backend):
+    base, chunks = frames
+    store = STORES[backend](tmp_path)
+    store.add(DataProcessor.prepare_frame(base.copy()))
+    store.commit()
+    staged = STAGING[backend](tmp_path)
+    staged.add(DataProcessor.prepare_frame(chunks[1].copy()))
+    counts = store.merge_staged(staged)
+    staged.discard()
+    store.commit()
+
+    assert counts["rows_added"] == len(chunks[1])
+    expected = cells(DataProcessor.from_frame(DataProcessor.prepare_frame(chunks[1].copy())).cube)
+    pd.testing.assert_frame_equal(cells(store), expected, check_exact=False)
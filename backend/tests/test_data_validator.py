@@ -0,0 +1,24 @@
+
+from data_validator import DataValidator, ValidationReport
+
+
+def test_messages_report_spreadsheet_rows(sample_frame):
+    df = sample_frame.head(6).copy()
+    df.loc[[0, 3], 'good_count'] = df.loc[[0, 3], 'total_count'] + 1
+    df.loc[4, 'operating_time'] = -1.0
+
+    is_valid, results = DataValidator.validate_data(df)
+    assert not is_valid
+    message = DataValidator.get_validation_message(results)
+    # Row 1 is the header, so the first data row is row 2
+    assert "Good count exceeds total count (rows 2, 5)" in message
+    assert "operating_time (rows 6)" in message
+
+
+def test_rows_count_on_across_chunks(sample_frame):
+    df = sample_frame.head(6).copy()
+    df.loc[4, 'total_count'] = 0
+    report = ValidationReport()
+    report.update(df.iloc[:3])
+    report.update(df.iloc[3:])
+    assert "total_count (rows 6)" in DataValidator.get_validation_message(report.results)
@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import ExitStack
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def chunks():
+    yield b"a"
+    yield b"b"
+
+
+def respond(fail_on):
+    """Run a ReleasingStreamingResponse whose send fails on the given message type"""
+    released = []
+    stack = ExitStack()
+    stack.callback(released.append, True)
+    response = main.ReleasingStreamingResponse(chunks(), stack)
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == fail_on:
+            raise OSError("client went away")
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(Exception):
+        asyncio.run(response(scope, receive, send))
+    return released
+
+
+@pytest.mark.parametrize("fail_on", ["http.response.start", "http.response.body"])
+def test_export_releases_when_the_client_disconnects(fail_on):
+    assert respond(fail_on) == [True]
+
+
+def test_export_releases_its_snapshot():
+    with TestClient(main.app) as client:
+        response = client.get("/api/export", params={"format": "csv", "gzip": "false"})
+        assert response.status_code == 200
+        assert main.datasets.stats()["in_flight_readers"] == {}
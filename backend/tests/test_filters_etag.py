@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_unchanged_filters_are_not_modified(client):
+    response = client.get("/api/filters")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    assert client.get("/api/filters", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/filters", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert client.get("/api/filters", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_weak_etags_match(client):
+    etag = client.get("/api/filters").headers["etag"]
+    response = client.get("/api/filters", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.parametrize("params", [
+    {"field": "device_ids"},
+    {"field": "device_ids", "prefix": "x"},
+    {"field": "device_ids", "limit": 1},
+    {"field": "device_ids", "limit": 1, "offset": 1},
+])
+def test_etag_depends_on_query(client, params):
+    etag = client.get("/api/filters").headers["etag"]
+    response = client.get("/api/filters", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert client.get("/api/filters", params=params,
+                      headers={"If-None-Match": response.headers["etag"]}).status_code == 304
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from generate_sample_data import iter_sample_chunks, iter_written_chunks, write_sample_data, yearly_improvement
+
+
+def test_write_sample_data_writes_without_being_consumed(tmp_path):
+    path = str(tmp_path / "sample.csv")
+    rows = write_sample_data(path, n_devices=4, n_locations=2, n_months=3, seed=1)
+    assert rows == 4 * 2 * 3
+    assert len(pd.read_csv(path)) == rows
+
+
+def test_iter_written_chunks_writes_as_it_is_consumed(tmp_path):
+    path = tmp_path / "sample.csv"
+    chunks = iter_written_chunks(str(path), n_devices=4, n_locations=2, n_months=3, seed=1)
+    assert not path.exists()
+    assert sum(len(chunk) for chunk in chunks) == len(pd.read_csv(path))
+
+
+def test_unknown_format_is_rejected_immediately(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported output format"):
+        iter_written_chunks(str(tmp_path / "sample.json"))
+
+
+def test_years_outside_the_table_are_clamped():
+    assert yearly_improvement(2020) == yearly_improvement(2024) == 1.0
+    assert yearly_improvement(2030) == yearly_improvement(2025) == 1.05
+    # Before 2024 the data is drawn like the 2024 baseline
+    early, baseline = (next(iter_sample_chunks(n_devices=3, n_locations=1, n_months=12, seed=1, start_year=year))
+                       for year in (2022, 2024))
+    pd.testing.assert_frame_equal(early.drop(columns='month'), baseline.drop(columns='month'))
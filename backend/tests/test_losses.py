@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import LOSS_CATEGORIES, DataProcessor
+
+# Availability losses (planned minus operating hours) of each hand-built series;
+# performance and quality are perfect, so no other category loses time
+SERIES_LOSSES = {
+    ("A", "L1"): [8, 10, 12, 9, 11, 60],  # an outlier in the last month
+    ("B", "L2"): [50, 50, 90],            # too few months to be scored
+    ("C", "L1"): [1, 1, 1, 1, 1, 1],
+}
+
+
+@pytest.fixture
+def losses_frame():
+    rows = []
+    for (device_id, location), losses in SERIES_LOSSES.items():
+        for i, loss in enumerate(losses):
+            operating_time = 100.0 - loss
+            # One-minute ideal cycle: this many parts take exactly the operating time
+            total_count = operating_time * 60
+            rows.append({
+                'device_id': device_id, 'location': location, 'month': f"2024-{i + 1:02d}",
+                'planned_production_time': 100.0, 'operating_time': operating_time,
+                'total_count': total_count, 'good_count': total_count, 'ideal_cycle_time': 1.0
+            })
+    return pd.DataFrame(rows)
+
+
+def test_cell_losses_add_up_to_the_categories(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    result = processor.analyze_losses()
+
+    cells = result["cells"]
+    assert len(cells) == len(sample_frame.drop_duplicates(['device_id', 'location', 'month']))
+    hours = {entry["category"]: entry["hours"] for entry in result["categories"]}
+    for category in LOSS_CATEGORIES:
+        assert sum(cell[category] for cell in cells) == pytest.approx(hours[category], abs=0.01 * len(cells))
+    for cell in cells:
+        assert cell["total_loss"] == pytest.approx(sum(cell[category] for category in LOSS_CATEGORIES), abs=0.02)
+        assert cell["total_loss"] <= cell["planned_hours"] + 0.01
+
+
+def test_cell_losses_follow_the_filters(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    device_id = str(sample_frame['device_id'].iloc[0])
+    cells = processor.analyze_losses(device_id=device_id)["cells"]
+    assert cells and all(cell["device_id"] == device_id for cell in cells)
+    assert "cells" not in processor.analyze_losses(include_cells=False)
+
+
+def test_losses_of_the_hand_built_frame(losses_frame):
+    result = DataProcessor.from_frame(losses_frame).analyze_losses()
+    hours = {entry["category"]: entry["hours"] for entry in result["categories"]}
+    assert hours == {"availability_loss": 306, "performance_loss": 0, "quality_loss": 0}
+    assert result["categories"][0]["category"] == "availability_loss"
+    assert result["categories"][-1]["cumulative_share"] == 100
+
+
+def test_pareto_is_sorted_and_accumulates_to_100(losses_frame):
+    pareto = DataProcessor.from_frame(losses_frame).analyze_losses()["pareto"]
+    assert [entry["device_id"] for entry in pareto["device_id"]] == ["B", "A", "C"]
+    assert [entry["total_loss"] for entry in pareto["device_id"]] == [190, 110, 6]
+    assert [entry["location"] for entry in pareto["location"]] == ["L2", "L1"]
+    for entries in pareto.values():
+        shares = [entry["share"] for entry in entries]
+        assert shares == sorted(shares, reverse=True)
+        assert np.cumsum(shares) == pytest.approx([entry["cumulative_share"] for entry in entries], abs=0.02)
+        assert entries[-1]["cumulative_share"] == pytest.approx(100)
+    top = DataProcessor.from_frame(losses_frame).analyze_losses(top_n=1)["pareto"]["device_id"]
+    assert [entry["device_id"] for entry in top] == ["B"]
+    assert top[0]["cumulative_share"] == pytest.approx(100 * 190 / 306, abs=0.01)
+
+
+@pytest.mark.parametrize("method, score", [("zscore", 2.23), ("iqr", 19.3)])
+def test_outlier_month_is_flagged(losses_frame, method, score):
+    outliers = DataProcessor.from_frame(losses_frame).analyze_losses(method=method)["outliers"]
+    # Series B has a larger loss but fewer than MIN_OUTLIER_MONTHS months
+    assert [(o["device_id"], o["month"], o["category"]) for o in outliers] == [("A", "2024-06", "availability_loss")]
+    assert outliers[0]["hours"] == 60
+    assert outliers[0]["score"] == pytest.approx(score, abs=0.01)
+
+
+@pytest.mark.parametrize("method, threshold, flagged", [
+    ("zscore", 2.2, True), ("zscore", 2.3, False),
+    ("iqr", 19.0, True), ("iqr", 19.5, False),
+])
+def test_threshold_moves_the_limit(losses_frame, method, threshold, flagged):
+    outliers = DataProcessor.from_frame(losses_frame).analyze_losses(method=method, threshold=threshold)["outliers"]
+    assert bool(outliers) == flagged
+
+
+def test_group_quantile_interpolates_within_each_group():
+    # Two groups, already sorted by (group, value): [8, 9, 10, 11, 12, 60] and [1, 3]
+    ordered = np.array([8, 9, 10, 11, 12, 60, 1, 3], dtype=float)
+    starts, counts = np.array([0, 6]), np.array([6, 2])
+    assert DataProcessor._group_quantile(ordered, starts, counts, 0.25).tolist() == [9.25, 1.5]
+    assert DataProcessor._group_quantile(ordered, starts, counts, 0.75).tolist() == [11.75, 2.5]
+    assert DataProcessor._group_quantile(ordered, starts, counts, 1.0).tolist() == [60, 3]
@@ -0,0 +1,109 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+
+
+def baseline_oee(df, device_id=None, location=None, month=None):
+    """calculate_oee as it was before the cube: filter the rows, then sum them"""
+    filtered = df
+    if device_id:
+        filtered = filtered[filtered['device_id'] == device_id]
+    if location:
+        filtered = filtered[filtered['location'] == location]
+    if month:
+        filtered = filtered[filtered['month'] == month]
+    if filtered.empty:
+        return {"oee": 0, "availability": 0, "performance": 0, "quality": 0}
+
+    planned_production_time = filtered['planned_production_time'].sum()
+    operating_time = filtered['operating_time'].sum()
+    total_count = filtered['total_count'].sum()
+    good_count = filtered['good_count'].sum()
+    ideal_cycle_time = filtered['ideal_cycle_time'].mean()
+
+    availability = operating_time / planned_production_time if planned_production_time > 0 else 0
+    performance = (total_count * ideal_cycle_time / 60) / operating_time if operating_time > 0 else 0
+    quality = good_count / total_count if total_count > 0 else 0
+    availability, performance, quality = (min(max(value, 0), 1) for value in (availability, performance, quality))
+    return {
+        "oee": round(availability * performance * quality * 100, 2),
+        "availability": round(availability * 100, 2),
+        "performance": round(performance * 100, 2),
+        "quality": round(quality * 100, 2)
+    }
+
+
+def filter_combinations(df):
+    """No filter, two real values and one unknown value per dimension"""
+    values = [[None, *sorted(df[col].astype(str).unique())[:2], 'MISSING']
+              for col in ('device_id', 'location', 'month')]
+    return itertools.product(*values)
+
+
+def test_cube_totals_match_baseline(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    for device_id, location, month in filter_combinations(sample_frame):
+        result = processor.calculate_oee(device_id=device_id, location=location, month=month)
+        expected = baseline_oee(sample_frame, device_id=device_id, location=location, month=month)
+        for component, value in expected.items():
+            assert result[component] == pytest.approx(value, abs=0.011), (device_id, location, month, component)
+
+
+def test_cube_follows_appended_rows(sample_frame):
+    months = sorted(sample_frame['month'].astype(str).unique())
+    first = sample_frame[sample_frame['month'].astype(str) != months[-1]]
+    processor = DataProcessor.from_frame(first.copy())
+    processor.append_data(sample_frame[sample_frame['month'].astype(str) == months[-1]].copy())
+
+    for device_id, location, month in filter_combinations(sample_frame):
+        result = processor.calculate_oee(device_id=device_id, location=location, month=month)
+        expected = baseline_oee(sample_frame, device_id=device_id, location=location, month=month)
+        assert result['oee'] == pytest.approx(expected['oee'], abs=0.011), (device_id, location, month)
+
+
+def test_batch_matches_single_lookups(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    filters = [{"device_id": d, "location": l, "month": m} for d, l, m in filter_combinations(sample_frame)]
+    for f, record in zip(filters, processor.calculate_oee_batch(filters)):
+        single = processor.calculate_oee(**f)
+        assert record['oee'] == single['oee']
+        assert record['quality'] == single['quality']
+
+
+def test_oee_frames_batch_the_grouped_result(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    group_by = ['device_id', 'location', 'month']
+    frames = list(processor.oee_frames(group_by, batch_rows=7))
+    assert all(len(frame) <= 7 for frame in frames)
+
+    exported = pd.concat(frames, ignore_index=True)
+    grouped = processor.calculate_oee_grouped(group_by)
+    assert len(exported) == len(grouped)
+    for row, record in zip(exported.to_dict('records'), grouped):
+        assert row['oee'] == record['oee']
+
+
+def test_oee_frames_yield_one_frame_when_nothing_matches(sample_frame):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    frames = list(processor.oee_frames(['device_id'], device_id='MISSING'))
+    assert len(frames) == 1 and frames[0].empty
+
+
+@pytest.mark.parametrize("group_by", [['month'], ['location', 'device_id'], ['month', 'device_id', 'location']])
+def test_cube_batches_match_grouped(sample_frame, group_by):
+    cube = DataProcessor.from_frame(sample_frame.copy()).cube
+    for device_id, location, month in filter_combinations(sample_frame):
+        filters = {'device_id': device_id, 'location': location, 'month': month}
+        frames = list(cube.iter_grouped(group_by, filters, batch_rows=5))
+        assert all(len(frame) <= 5 for frame in frames)
+        pd.testing.assert_frame_equal(pd.concat(frames), cube.grouped(group_by, filters))
+
+
+@pytest.mark.parametrize("top_n", [0, -1])
+def test_rankings_reject_top_n_below_one(sample_frame, top_n):
+    processor = DataProcessor.from_frame(sample_frame.copy())
+    with pytest.raises(ValueError, match="top_n must be at least 1"):
+        processor.rank_devices(top_n=top_n)
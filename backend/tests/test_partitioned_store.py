@@ -0,0 +1,67 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from partitioned_store import MANIFEST_FILE, PartitionedStore
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "partitions")
+
+
+@pytest.fixture
+def prepared(sample_frame):
+    return DataProcessor.prepare_frame(sample_frame.copy())
+
+
+def sorted_keys(store) -> pd.DataFrame:
+    return store.keys().astype(str).sort_values(list(store.keys().columns)).reset_index(drop=True)
+
+
+def test_device_ids_survive_reopening(root, prepared):
+    store = PartitionedStore(root)
+    store.add(prepared)
+    store.commit()
+    with open(os.path.join(root, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    assert all('device_ids' not in part for part in manifest['partitions'])
+
+    reopened = PartitionedStore.open(root)
+    assert reopened.available_filters() == store.available_filters()
+    pd.testing.assert_frame_equal(sorted_keys(reopened), sorted_keys(store))
+    device_id = str(prepared['device_id'].iloc[0])
+    assert reopened.totals(device_id=device_id) == store.totals(device_id=device_id)
+    assert reopened.totals(device_id='MISSING') is None
+
+
+def test_vacuum_keeps_only_the_committed_device_file(root, prepared):
+    store = PartitionedStore(root)
+    store.add(prepared.iloc[:10])
+    store.commit()
+    store.append(prepared.iloc[10:])
+    store.commit()
+    store.vacuum()
+
+    device_files = [name for name in os.listdir(root) if name.startswith('devices-')]
+    assert len(device_files) == 1
+    assert PartitionedStore.open(root).row_count == len(prepared)
+
+
+def test_opens_manifests_that_list_device_ids(root, prepared):
+    store = PartitionedStore(root)
+    store.add(prepared)
+    store.commit()
+    path = os.path.join(root, MANIFEST_FILE)
+    with open(path) as f:
+        manifest = json.load(f)
+    for part, key in zip(manifest['partitions'], sorted(store._partitions)):
+        part['device_ids'] = store._partitions[key]['device_ids'].tolist()
+    del manifest['devices']
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+
+    pd.testing.assert_frame_equal(sorted_keys(PartitionedStore.open(root)), sorted_keys(store))
@@ -0,0 +1,40 @@
+import pytest
+
+from query_processor import QueryProcessor
+
+FILTERS = {
+    "device_ids": ["PACK001", "PACK002", "WRAP001", "WRAP002", "SEAL001"],
+    "locations": ["FINAL_PACKAGING", "PRODUCTION_LINE_1", "PRODUCTION_LINE_2", "QUALITY_CONTROL"],
+    "months": ["2024-01", "2024-03", "2025-01", "2025-12"]
+}
+
+
+@pytest.fixture
+def processor():
+    return QueryProcessor(FILTERS)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("march 2024", (None, None, "2024-03")),
+    ("wrap 2 at quality control", ("WRAP002", "QUALITY_CONTROL", None)),
+    ("show oee for pack001 in production line 1 for january 2025", ("PACK001", "PRODUCTION_LINE_1", "2025-01")),
+    ("oee of device 2 in production_line_2", ("PACK002", "PRODUCTION_LINE_2", None)),
+    ("seal1 2025-12", ("SEAL001", None, "2025-12")),
+    ("final packaging in december 2025", (None, "FINAL_PACKAGING", "2025-12")),
+    ("what is the overall oee", (None, None, None))
+])
+def test_process_query(processor, query, expected):
+    result = processor.process_query(query)
+    assert (result["device_id"], result["location"], result["month"]) == expected
+
+
+def test_numbered_entities_outside_the_vocabulary_use_templates(processor):
+    result = processor.process_query("pack 7 on production line 9")
+    assert result["device_id"] == "PACK007"
+    assert result["location"] == "PRODUCTION_LINE_9"
+
+
+def test_update_vocabulary_adds_new_values(processor):
+    assert processor.process_query("oee at packing hall")["location"] is None
+    processor.update_vocabulary({**FILTERS, "locations": FILTERS["locations"] + ["PACKING_HALL"]})
+    assert processor.process_query("oee at packing hall")["location"] == "PACKING_HALL"
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from data_processor import DataProcessor
+from sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "oee.sqlite3")
+
+
+@pytest.fixture
+def prepared(sample_frame):
+    return DataProcessor.prepare_frame(sample_frame.copy())
+
+
+def test_store_reads_one_snapshot_until_released(path, prepared):
+    writer = SQLiteStore(path)
+    writer.add(prepared.iloc[:10])
+    writer.commit()
+
+    reader = SQLiteStore(path)
+    before = reader.totals()
+    generation = reader.generation
+
+    # Another worker commits more rows over the same file
+    other = SQLiteStore(path)
+    other.add(prepared.iloc[10:])
+    other.commit()
+
+    assert reader.totals() == before
+    assert reader.row_count == 10
+    assert reader.generation == generation
+    assert SQLiteStore.committed_state(path) == (other.generation, len(prepared))
+
+    reader.release()
+    assert reader.row_count == len(prepared)
+    assert reader.generation == other.generation
+
+
+def test_row_count_follows_writes(path, prepared):
+    store = SQLiteStore(path)
+    store.add(prepared)
+    store.commit()
+    changed = prepared.iloc[:5].copy()
+    changed['good_count'] = changed['good_count'] - 1
+
+    store.append(changed, replace_existing=True)
+    assert store.row_count == len(prepared)
+    store.commit()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM oee_rows").fetchone()[0] == store.row_count
+
+    empty = SQLiteStore.empty(path)
+    assert empty.row_count == 0
+    empty.rollback()
+    assert SQLiteStore.committed_state(path)[1] == len(prepared)
+
+
+def test_every_commit_bumps_the_generation(path, prepared):
+    store = SQLiteStore(path)
+    first = store.generation
+    store.add(prepared.iloc[:1])
+    store.commit()
+    assert store.generation == first + 1
+    store.rollback()
+    assert SQLiteStore.committed_state(path)[0] == first + 1
@@ -0,0 +1,16 @@
+import asyncio
+import os
+
+from workers import WorkerPool
+
+
+def test_pool_starts_on_first_run_and_again_after_shutdown():
+    pool = WorkerPool(1, kind="process")
+    assert pool._executor is None
+
+    assert asyncio.run(pool.run(os.getpid)) != os.getpid()
+    pool.shutdown()
+    assert pool._executor is None
+    # A new event loop, as with each TestClient or server start
+    assert asyncio.run(pool.run(sum, [1, 2])) == 3
+    pool.shutdown()
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import profiled
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Runs blocking pandas/openpyxl work off the event loop.
+
+    Work is submitted to a thread or process pool, and an asyncio semaphore
+    bounds how many calls may be queued or running at once so a burst of
+    heavy requests cannot pile up unbounded work. The executor is started on
+    the first call, so creating a pool (e.g. when importing main) starts no
+    threads or processes, and after shutdown() the next call starts a new one.
+    """
+
+    def __init__(self, max_workers: int, kind: str = "thread", max_pending: Optional[int] = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 4
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(self.max_pending)
+
+    def _started(self) -> Executor:
+        # Only called from the event loop thread, so no lock is needed
+        if self._executor is None:
+            self._executor = (ProcessPoolExecutor(max_workers=self.max_workers) if self.kind == "process"
+                              else ThreadPoolExecutor(max_workers=self.max_workers))
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            call = partial(fn, *args, **kwargs)
+            if self.kind == "thread":
+                # Carry the caller's context so per-request spans and profiles include the worker
+                call = partial(contextvars.copy_context().run, profiled, call)
+            return await loop.run_in_executor(self._started(), call)
+
+    def shutdown(self):
+        """Stop the executor if it was started; the semaphore is renewed for the next event loop"""
+        executor, self._executor = self._executor, None
+        self._semaphore = asyncio.Semaphore(self.max_pending)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class JobManager:
+    """
+    Tracks background jobs (such as uploads) so clients can poll their status.
+    Only the most recent max_jobs jobs are remembered.
+    """
+
+    def __init__(self, max_jobs: int = 200):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._tasks = set()
+
+    def submit(self, kind: str, work: Callable[[], Awaitable[Any]]) -> Dict:
+        """Schedule a coroutine function as a background job and return its record"""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        self._jobs[job["job_id"]] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+        task = asyncio.create_task(self._run(job, work))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Dict, work: Callable[[], Awaitable[Any]]):
+        job["status"] = "running"
+        try:
+            job["result"] = await work()
+            job["status"] = "succeeded"
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job['job_id'], job['kind'], e)
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            job["finished_at"] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self._jobs.get(job_id)
+
+
+def pool_size(env_name: str, default: int) -> int:
+    """Read a pool size from the environment, falling back to default"""
+    return max(1, int(os.getenv(env_name, str(default))))
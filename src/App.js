@@ -45,6 +45,16 @@ function App() {
     }
   };
 
+  const waitForJob = async (jobId) => {
+    // Uploads are ingested in the background; poll until the job finishes
+    for (;;) {
+      const { data: job } = await axios.get(`http://localhost:8000/api/jobs/${jobId}`);
+      if (job.status === 'succeeded') return job;
+      if (job.status === 'failed') throw new Error(job.error);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileUpload = async (event) => {
     const file = event.target.files[0];
     if (!file) return;
@@ -54,7 +64,8 @@ function App() {
     formData.append('file', file);
 
     try {
-      await axios.post('http://localhost:8000/api/upload', formData);
+      const { data } = await axios.post('http://localhost:8000/api/upload', formData);
+      await waitForJob(data.job_id);
       await fetchFilters();
       addMessage('File uploaded successfully. You can now query OEE data.', 'bot');
     } catch (error) {